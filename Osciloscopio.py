@@ -15,10 +15,10 @@ buffer_size = 16384        # Tamanho do buffer de aquisição
 sample_rate = 125e6        # Taxa de amostragem
 
 # Configuração inicial
-rp_s.tx_txt('ACQ:RST')
-rp_s.tx_txt('ACQ:DEC 1')
-rp_s.tx_txt('ACQ:TRIG:LEV 0')
-rp_s.tx_txt('ACQ:TRIG:DLY 0')
+rp_s.acq_reset()
+rp_s.acq_set(dec=1)
+rp_s.acq_trig_set(trig_lvl=0, trig_delay=0)
+rp_s.acq_set_fast_mode()  # Dados binários RAW, convertidos para Volts no computador
 
 # Configuração dos subplots
 plt.ion()
@@ -46,43 +46,29 @@ for i in range(4):
 
 plt.tight_layout()
 
-def ler_canal(canal):
-    """Lê os dados de um canal específico"""
-    rp_s.tx_txt(f'ACQ:SOUR{canal}:DATA?')
-    data_str = rp_s.rx_txt().strip('{}\n\r').replace("  ", "").split(',')
-    return np.array(list(map(float, data_str)))
+# Aquisição em segundo plano: arma o trigger no canal 1, espera e lê os quatro canais
+# enquanto o quadro anterior ainda está sendo desenhado
+aquisicao = scpi.Acquirer(rp_s, [1, 2, 3, 4], trigger='CH1_PE', timeout=0.5, interval=tempo_atualizacao)
 
 start_time = time.time()
-next_acquisition = start_time
 
 try:
+    aquisicao.start()
     while time.time() - start_time < tempo_total_segundos:
-        if time.time() >= next_acquisition:
+        quadro = aquisicao.get(timeout=0)  # Quadro mais recente, se já houver um pronto
+        if quadro is not None:
+            _, _, dados = quadro
             
-            print(f"\nAquisição em {datetime.now().strftime('%H:%M:%S')}")
-            # Configura trigger no canal 1
-            rp_s.tx_txt('ACQ:TRIG CH1_PE')
-            
-            # Inicia aquisição
-            rp_s.tx_txt('ACQ:START')
-            
-            # Espera trigger
-            trigger_timeout = time.time() + 0.5
-            while True:
-                rp_s.tx_txt('ACQ:TRIG:STAT?')
-                if rp_s.rx_txt() == 'TD' or time.time() > trigger_timeout:
-                    break
-            
-            # Adquire dados dos quatro canais
+            print(f"\nAquisição em {datetime.now().strftime('%H:%M:%S')} (quadros descartados: {aquisicao.dropped})")
             current_maxes = []
             current_mins = []
             
             for ch in range(4):
-                data = ler_canal(ch+1)
+                data = dados[ch]
                 
                 # Converte amostras para tempo
                 if time_axis is None:
-                    time_axis = np.arange(len(data)) / sample_rate
+                    time_axis = data.time_axis()  # Usa a taxa real (com decimação)
                 
                 # Calcula amplitudes máxima e mínima deste canal
                 chan_max = np.max(data)
@@ -126,7 +112,6 @@ try:
                 axs[row, col].autoscale_view(True, True, True)
             
             fig.canvas.flush_events()
-            next_acquisition = time.time() + tempo_atualizacao
             
         plt.pause(0.01)
 
@@ -140,6 +125,7 @@ except KeyboardInterrupt:
     print(f"Amplitude máxima global: {global_max:.3f}V")
     
 finally:
+    aquisicao.stop()
     rp_s.tx_txt('ACQ:STOP')
     rp_s.close()
     plt.ioff()
@@ -48,11 +48,7 @@ try:
             rp_s.tx_txt('ACQ:START')
             
             # Esperando pelo trigger
-            trigger_timeout = time.time() + 0.5
-            while True:
-                rp_s.tx_txt('ACQ:TRIG:STAT?')
-                if rp_s.rx_txt() == 'TD' or time.time() > trigger_timeout:
-                    break
+            rp_s.wait_triggered(0.5)
             
             #Adquirindo os dados
             data = rp_s.ler_canal(canal)
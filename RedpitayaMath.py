@@ -1,24 +1,761 @@
+import os
+import queue
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+def interpolar_pico(freq, db, k):
+    """
+    Refina a posição e a amplitude de picos por interpolação parabólica (em dB).
+
+    Args:
+        freq (ndarray): Eixo de frequência (bins,), igualmente espaçado.
+        db (ndarray): Espectros em dB (..., bins).
+        k (ndarray): Índices inteiros dos picos (..., m), no mesmo formato de db exceto o último eixo.
+
+    Returns:
+        (ndarray, ndarray): Frequências e amplitudes interpoladas (..., m).
+    """
+    ultimo = db.shape[-1] - 1
+    a = np.take_along_axis(db, np.clip(k - 1, 0, ultimo), axis=-1)
+    b = np.take_along_axis(db, k, axis=-1)
+    c = np.take_along_axis(db, np.clip(k + 1, 0, ultimo), axis=-1)
+
+    den = a - 2*b + c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = np.where(den < 0, 0.5 * (a - c) / den, 0.0)
+    delta = np.clip(delta, -0.5, 0.5)
+
+    return freq[k] + delta * (freq[1] - freq[0]), b - 0.25 * (a - c) * delta
+
+class SpectrumEngine (object):
+    """
+    Calcula espectros em dB com RBW ajustável.
+
+    A janela, o eixo de frequência, a escala e os buffers de saída são calculados uma vez
+    para cada tamanho de FFT e reaproveitados nas chamadas seguintes. Mudar a RBW só troca
+    o plano em uso (os planos já usados ficam guardados).
+
+    calcular() aceita um canal (amostras,) ou um bloco (canais, amostras), ou ainda
+    (placas, canais, amostras): todos os espectros saem de uma única rfft ao longo do
+    último eixo.
+
+    Com welch=True o sinal inteiro é usado: ele é dividido em segmentos de n_rbw amostras
+    (com sobreposição) e as potências dos segmentos são promediadas, reduzindo a variância
+    do ruído sem mudar a RBW. Entre quadros, o resultado pode ainda passar por uma média
+    'rms' (potência), 'video' (dB) ou 'pico' (peak hold) das últimas n_medias aquisições.
+
+    Se o sinal for um AcqData (redpitaya_scpi), a taxa de amostragem real (com decimação)
+    vem dele, e o tamanho da FFT para a RBW pedida é recalculado automaticamente.
+
+    Os arrays devolvidos por calcular() são reescritos na próxima chamada com o mesmo
+    formato; use .copy() se precisar guardá-los.
+    """
+
+    MEDIAS = (None, 'rms', 'video', 'pico')
+
+    def __init__(self, rbw, sample_rate=125e6, window='hanning', normalizar=False,
+                 welch=False, sobreposicao=0.5, media=None, n_medias=10):
+        """
+        Args:
+            rbw (float): Resolution bandwidth desejada em Hz.
+            sample_rate (float, opcional): Taxa de amostragem em S/s. Padrão 125e6.
+            window (str, opcional): Nome da janela do numpy (hanning, hamming, blackman, bartlett). Padrão 'hanning'.
+            normalizar (bool, opcional): Se True, o espectro é escalado para amplitude de pico (dBV).
+                Se False, usa a escala das versões anteriores (sem normalização). Padrão False.
+            welch (bool, opcional): Promedia todos os segmentos de n_rbw amostras do sinal (método de Welch).
+                Se False, só as primeiras n_rbw amostras são usadas. Padrão False.
+            sobreposicao (float, opcional): Fração de sobreposição entre segmentos no modo Welch (0 a <1). Padrão 0.5.
+            media (str, opcional): Média entre quadros: None, 'rms', 'video' ou 'pico'. Padrão None.
+            n_medias (int, opcional): Número de quadros da média entre quadros. Padrão 10.
+        """
+        assert 0 <= sobreposicao < 1, "Sobreposição deve estar entre 0 e 1"
+        self.sample_rate = sample_rate
+        self.window = window
+        self.normalizar = normalizar
+        self.welch = welch
+        self.sobreposicao = sobreposicao
+        self._planos = {}
+        self._buffers = {}
+        self.set_media(media, n_medias)
+        self.set_rbw(rbw)
+
+    def set_rbw(self, rbw):
+        """Altera a RBW. O tamanho da FFT passa a ser sample_rate / rbw. Reinicia a média entre quadros."""
+        self.rbw = rbw
+        self.n_rbw = max(int(self.sample_rate / rbw), 2)  # Pelo menos 2 pontos
+        self.reset_media()
+
+    def set_sample_rate(self, sample_rate):
+        """Altera a taxa de amostragem (ex.: outra decimação), mantendo a RBW."""
+        self.sample_rate = sample_rate
+        self.set_rbw(self.rbw)
+
+    def set_media(self, media, n_medias=10):
+        """Altera o tipo de média entre quadros (None, 'rms', 'video' ou 'pico') e reinicia a média."""
+        assert media in self.MEDIAS, f"Média deve ser uma de {self.MEDIAS}"
+        self.media = media
+        self.n_medias = max(int(n_medias), 1)
+        self.reset_media()
+
+    def reset_media(self):
+        """Descarta os quadros acumulados na média entre quadros."""
+        self._acumulado = None
+        self._contagem = 0
+
+    def _plano(self, n):
+        # Janela, eixo de frequência e escala para uma FFT de n pontos na taxa atual
+        plano = self._planos.get((n, self.sample_rate))
+        if plano is None:
+            janela = getattr(np, self.window)(n)
+            freq = np.fft.rfftfreq(n, d=1/self.sample_rate)[:n//2]
+            escala = 2 / np.sum(janela) if self.normalizar else 1.0
+            plano = (janela, freq, escala)
+            self._planos[(n, self.sample_rate)] = plano
+        return plano
+
+    def _buffer(self, formato):
+        # Buffers para segmentos com esse formato (..., segmentos, n):
+        # entrada com janela, |X|² de cada segmento e saída (potência média, depois dB)
+        buffers = self._buffers.get(formato)
+        if buffers is None:
+            meio = formato[:-1] + (formato[-1]//2,)
+            buffers = (np.empty(formato), np.empty(meio), np.empty(meio[:-2] + meio[-1:]))
+            self._buffers[formato] = buffers
+        return buffers
+
+    def _segmentos(self, sinal, n):
+        # Visão (..., segmentos, n) do sinal, sem cópia
+        if not self.welch:
+            return sinal[..., np.newaxis, :n]
+        passo = max(int(n * (1 - self.sobreposicao)), 1)
+        return sliding_window_view(sinal, n, axis=-1)[..., ::passo, :]
+
+    def frequencias(self, n=None):
+        """Eixo de frequência (Hz) do plano atual, ou de um sinal com n amostras."""
+        n = self.n_rbw if n is None else min(self.n_rbw, max(n, 2))
+        return self._plano(n)[1]
+
+    def calcular(self, sinal):
+        """
+        Calcula o espectro de um sinal ou de um bloco de sinais.
+
+        Args:
+            sinal (ndarray): Amostras no tempo, (amostras,) ou (..., amostras).
+                Sem Welch, só as primeiras n_rbw amostras de cada sinal são usadas.
+
+        Returns:
+            (ndarray, ndarray): Frequências em Hz e amplitude em dB, com o mesmo
+                formato do sinal no lugar do eixo de amostras.
+        """
+        sample_rate = getattr(sinal, 'sample_rate', None)
+        if sample_rate is not None and sample_rate != self.sample_rate:
+            self.set_sample_rate(sample_rate)
+
+        sinal = np.asarray(sinal)
+        n = min(self.n_rbw, sinal.shape[-1])  # Não pode ser maior que o buffer
+        n = max(n, 2)
+        janela, freq, escala = self._plano(n)
+        segmentos = self._segmentos(sinal, n)
+        x, pot, db = self._buffer(segmentos.shape)
+
+        # Recorta os sinais e aplica a janela no buffer
+        np.multiply(segmentos, janela, out=x)
+
+        # FFT real de todos os segmentos de uma vez: só as frequências positivas são calculadas
+        np.abs(np.fft.rfft(x, axis=-1)[..., :n//2], out=pot)
+        pot *= pot
+
+        # Potência média dos segmentos (Welch); com um segmento é a própria potência
+        np.mean(pot, axis=-2, out=db)
+        if escala != 1.0:
+            db *= escala**2
+        self._finalizar(db)
+
+        return freq, db
+
+    def calcular_zoom(self, sinal, centro, span, taps_por_fase=8):
+        """
+        Calcula o espectro só na faixa centro ± span/2 (zoom FFT).
+
+        O sinal é deslocado para banda base (centro -> 0 Hz), filtrado por um passa-baixa
+        e decimado para cerca de 2 x span; a FFT (complexa) é feita só sobre essas amostras.
+        A RBW usada é a do objeto, limitada pela duração do sinal: com 16384 amostras a
+        125 MS/s ela não fica abaixo de ~7,6 kHz; para RBWs mais finas use decimação na
+        aquisição (AcqData) ou capturas mais longas.
+
+        Args:
+            sinal (ndarray): Amostras no tempo, (amostras,) ou (..., amostras).
+            centro (float): Frequência central em Hz.
+            span (float): Largura da faixa em Hz.
+            taps_por_fase (int, opcional): Tamanho do filtro passa-baixa, em múltiplos do fator
+                de decimação. Padrão 8.
+
+        Returns:
+            (ndarray, ndarray): Frequências em Hz (absolutas) e amplitude em dB.
+        """
+        sample_rate = getattr(sinal, 'sample_rate', None)
+        if sample_rate is not None and sample_rate != self.sample_rate:
+            self.set_sample_rate(sample_rate)
+
+        sinal = np.asarray(sinal)
+        decimacao, oscilador, filtro, fs_zoom = self._plano_zoom(sinal.shape[-1], centro, span, taps_por_fase)
+
+        # Desloca o centro para 0 Hz
+        misturado = self._buffer_zoom(sinal.shape)
+        np.multiply(sinal, oscilador, out=misturado)
+
+        # Passa-baixa + decimação (polifásico): o filtro só é calculado nas amostras que sobram
+        janelas = sliding_window_view(misturado, len(filtro), axis=-1)[..., ::decimacao, :]
+        banda_base = janelas @ filtro
+
+        n = min(max(int(fs_zoom / self.rbw), 2), banda_base.shape[-1])
+        n = max(n, 2)
+        janela, freq, selecao, escala = self._plano_zoom_fft(n, fs_zoom, centro, span)
+
+        # FFT complexa dos segmentos (Welch, se ativado) e potência média
+        x = self._segmentos(banda_base, n) * janela
+        pot = np.abs(np.fft.fft(x, axis=-1))
+        pot *= pot
+        db = np.fft.fftshift(np.mean(pot, axis=-2), axes=-1)[..., selecao]
+        if escala != 1.0:
+            db *= escala**2
+        self._finalizar(db)
+
+        return freq, db
+
+    def _plano_zoom(self, n, centro, span, taps_por_fase):
+        # Oscilador, filtro passa-baixa e decimação para um sinal de n amostras
+        chave = (n, centro, span, taps_por_fase, self.sample_rate)
+        plano = self._planos.get(chave)
+        if plano is None:
+            decimacao = max(int(self.sample_rate / (2 * span)), 1)
+            oscilador = np.exp(-2j * np.pi * centro / self.sample_rate * np.arange(n))
+
+            # Sinc com janela de Hamming, corte em span/2 e ganho 1 em DC
+            taps = min(taps_por_fase * decimacao + 1, n)
+            k = np.arange(taps) - (taps - 1) / 2
+            filtro = np.sinc(span / self.sample_rate * k) * np.hamming(taps)
+            filtro /= np.sum(filtro)
+
+            plano = (decimacao, oscilador, filtro[::-1].copy(), self.sample_rate / decimacao)
+            self._planos[chave] = plano
+        return plano
+
+    def _plano_zoom_fft(self, n, fs_zoom, centro, span):
+        # Janela, eixo de frequência (absoluto, só dentro do span) e escala da FFT complexa
+        chave = ('fft', n, fs_zoom, centro, span)
+        plano = self._planos.get(chave)
+        if plano is None:
+            janela = getattr(np, self.window)(n)
+            freq = np.fft.fftshift(np.fft.fftfreq(n, d=1/fs_zoom))
+            selecao = np.flatnonzero(np.abs(freq) <= span / 2)
+            escala = 2 / np.sum(janela) if self.normalizar else 1.0
+            plano = (janela, freq[selecao] + centro, selecao, escala)
+            self._planos[chave] = plano
+        return plano
+
+    def _buffer_zoom(self, formato):
+        # Buffer complexo para o sinal deslocado para banda base
+        chave = ('zoom', formato)
+        buffer = self._buffers.get(chave)
+        if buffer is None:
+            buffer = self._buffers[chave] = np.empty(formato, dtype=complex)
+        return buffer
+
+    def _finalizar(self, pot):
+        # Potência -> dB, com a média entre quadros configurada
+        if self.media == 'video':
+            self._em_db(pot)
+            self._acumular(pot)
+        elif self.media is not None:
+            self._acumular(pot)
+            self._em_db(pot)
+        else:
+            self._em_db(pot)
+
+    @staticmethod
+    def _em_db(pot):
+        # Potência -> dB, no próprio buffer
+        pot += 1e-20
+        np.log10(pot, out=pot)
+        pot *= 10
+
+    def _acumular(self, valor):
+        # Média entre quadros, no próprio buffer: ao final valor contém o resultado acumulado
+        if self._acumulado is None or self._acumulado.shape != valor.shape:
+            self._acumulado = valor.copy()
+            self._contagem = 1
+        else:
+            if self.media == 'pico':
+                np.maximum(self._acumulado, valor, out=self._acumulado)
+            else:
+                # Média dos primeiros n_medias quadros, depois média exponencial com o mesmo peso
+                self._contagem = min(self._contagem + 1, self.n_medias)
+                self._acumulado += (valor - self._acumulado) / self._contagem
+            valor[...] = self._acumulado
+
+    # Meia largura (em bins) do lóbulo principal de cada janela
+    LOBULO = {'hanning': 2, 'hamming': 2, 'bartlett': 2, 'blackman': 3}
+
+    def medir(self, freq, db, n_picos=5, n_harmonicos=5):
+        """
+        Medidas de um espectro (ou bloco de espectros) calculado por este objeto.
+
+        Tudo é calculado de forma vetorizada sobre o array em dB, para todos os canais juntos.
+        A fundamental é o maior pico fora do DC; os harmônicos são procurados em k x fundamental
+        (rebatidos na Nyquist) e todas as potências são somadas sobre o lóbulo principal da janela.
+
+        Args:
+            freq (ndarray): Frequências em Hz (bins,), como devolvido por calcular().
+            db (ndarray): Espectros em dB (..., bins).
+            n_picos (int, opcional): Número de picos devolvidos. Padrão 5.
+            n_harmonicos (int, opcional): Número de harmônicos (2ª, 3ª, ...). Padrão 5.
+
+        Returns:
+            dict: Arrays com o formato (...) dos canais, mais um eixo quando indicado:
+                picos_freq, picos_db (..., n_picos): maiores picos, do maior para o menor pela amplitude
+                    interpolada devolvida (NaN se faltarem).
+                fundamental_freq, fundamental_db: fundamental.
+                harmonicos_freq, harmonicos_db (..., n_harmonicos): 2º harmônico em diante.
+                ruido_db: patamar de ruído (potência média por bin, longe do DC, do sinal e dos harmônicos).
+                snr_db: potência da fundamental / potência do ruído na faixa toda.
+                sfdr_db: fundamental - maior espúrio (dBc).
+                thd_db: potência dos harmônicos / fundamental (dBc).
+        """
+        freq = np.asarray(freq)
+        db = np.asarray(db)
+        bins = db.shape[-1]
+        lobulo = self.LOBULO.get(self.window, 3)
+        dc = lobulo + 1  # Bins ignorados junto ao DC
+        vizinhos = np.arange(-lobulo, lobulo + 1)
+
+        # Máximos locais (os demais bins valem -inf)
+        picos = np.full(db.shape, -np.inf)
+        meio = db[..., 1:-1]
+        np.copyto(picos[..., 1:-1], meio, where=(meio > db[..., :-2]) & (meio >= db[..., 2:]))
+        picos[..., :dc] = -np.inf
+
+        # Maiores picos: os candidatos saem do valor no bin, mas a ordem final é a da amplitude
+        # interpolada (a interpolação pode inverter picos quase empatados), por isso há folga
+        n_candidatos = min(2 * n_picos, bins)
+        k = np.argpartition(picos, -n_candidatos, axis=-1)[..., -n_candidatos:]
+        picos_freq, picos_db = interpolar_pico(freq, db, k)
+        validos = np.isfinite(np.take_along_axis(picos, k, axis=-1))
+        ordem = np.argsort(-np.where(validos, picos_db, -np.inf), axis=-1, kind='stable')[..., :n_picos]
+        k = np.take_along_axis(k, ordem, axis=-1)
+        validos = np.take_along_axis(validos, ordem, axis=-1)
+        picos_freq = np.where(validos, np.take_along_axis(picos_freq, ordem, axis=-1), np.nan)
+        picos_db = np.where(validos, np.take_along_axis(picos_db, ordem, axis=-1), np.nan)
+        k0 = k[..., :1]
+
+        # Harmônicos: bin esperado (rebatido na Nyquist) e o maior valor em volta dele
+        df = freq[1] - freq[0]
+        nyquist = bins * df
+        fh = (picos_freq[..., :1] * np.arange(2, n_harmonicos + 2)) % (2 * nyquist)
+        fh = np.where(fh > nyquist, 2 * nyquist - fh, fh)
+        kh = np.clip(np.rint((fh - freq[0]) / df).astype(int), 0, bins - 1)
+        janela = np.clip(kh[..., None] + vizinhos, 0, bins - 1)
+        valores = np.take_along_axis(db, janela.reshape(db.shape[:-1] + (-1,)), axis=-1).reshape(janela.shape)
+        kh = np.take_along_axis(janela, np.argmax(valores, axis=-1)[..., None], axis=-1)[..., 0]
+        harmonicos_freq, harmonicos_db = interpolar_pico(freq, db, kh)
+
+        # Potências somadas nos lóbulos da fundamental e dos harmônicos
+        pot = 10 ** (db / 10)
+        lobulos = np.clip(np.concatenate([k0, kh], axis=-1)[..., None] + vizinhos, 0, bins - 1)
+        lobulos = lobulos.reshape(db.shape[:-1] + (-1,))
+        pot_lobulos = np.take_along_axis(pot, lobulos, axis=-1).reshape(db.shape[:-1] + (-1, len(vizinhos))).sum(axis=-1)
+        pot_fundamental = pot_lobulos[..., 0]
+        pot_harmonicos = pot_lobulos[..., 1:].sum(axis=-1)
+
+        # Ruído: bins fora do DC e das saias (5 lóbulos, onde ainda há vazamento) da fundamental e dos harmônicos
+        saias = np.arange(-5 * lobulo, 5 * lobulo + 1)
+        saias = np.clip(np.concatenate([k0, kh], axis=-1)[..., None] + saias, 0, bins - 1)
+        sinal = np.zeros(db.shape, dtype=bool)
+        sinal[..., :dc] = True
+        np.put_along_axis(sinal, saias.reshape(db.shape[:-1] + (-1,)), True, axis=-1)
+        n_ruido = np.maximum(np.count_nonzero(~sinal, axis=-1), 1)
+        ruido_bin = np.where(sinal, 0.0, pot).sum(axis=-1) / n_ruido
+
+        # Maior espúrio: maior pico fora do lóbulo da fundamental
+        espurios = np.where(np.abs(np.arange(bins) - k0) > lobulo, picos, -np.inf).max(axis=-1)
+
+        with np.errstate(divide='ignore'):
+            return {
+                'picos_freq': picos_freq,
+                'picos_db': picos_db,
+                'fundamental_freq': picos_freq[..., 0],
+                'fundamental_db': picos_db[..., 0],
+                'harmonicos_freq': harmonicos_freq,
+                'harmonicos_db': harmonicos_db,
+                'ruido_db': 10 * np.log10(ruido_bin),
+                'snr_db': 10 * np.log10(pot_fundamental / (ruido_bin * (bins - dc))),
+                'sfdr_db': picos_db[..., 0] - espurios,
+                'thd_db': 10 * np.log10(pot_harmonicos / pot_fundamental),
+            }
 
 class math (object):
-    def calcular_fft(sinal, rbw):
-        
-        sample_rate = 125e6
-        ts = 1/sample_rate
-        
-        n = len(sinal)
-        
-        # Calcula o tamanho necessário da FFT para atingir a RBW desejada
-        n_rbw = int(sample_rate / rbw)
-        n_rbw = min(n_rbw, n)  # Não pode ser maior que o buffer
-        n_rbw = max(n_rbw, 2)  # Pelo menos 2 pontos
-        
-        # Recorta o sinal para o novo tamanho
-        sinal_recortado = sinal[:n_rbw]
-        
-        window = np.hanning(n_rbw)
-        fft_result = np.fft.fft(sinal_recortado * window)
-        fft_freq = np.fft.fftfreq(n_rbw, d=ts)[:n_rbw//2]
-        fft_db = 20 * np.log10(np.abs(fft_result[:n_rbw//2]) + 1e-10)
-        
-        return fft_freq, fft_db
\ No newline at end of file
+    _motores = {}
+
+    @staticmethod
+    def calcular_fft(sinal, rbw, sample_rate=125e6):
+        # Mantida por compatibilidade; usa um SpectrumEngine guardado por taxa de amostragem
+        motor = math._motores.get(sample_rate)
+        if motor is None:
+            motor = math._motores[sample_rate] = SpectrumEngine(rbw, sample_rate)
+        elif motor.rbw != rbw:
+            motor.set_rbw(rbw)
+
+        fft_freq, fft_db = motor.calcular(sinal)
+        return fft_freq.copy(), fft_db.copy()
+
+class SweptSpectrum (object):
+    """
+    Espectro varrido: junta segmentos capturados com decimações diferentes para chegar a
+    RBWs que um buffer de 16384 amostras a 125 MS/s não resolve (abaixo de ~7,6 kHz).
+
+    A RBW alcançável é sample_rate / (decimação x amostras), então RBWs finas exigem
+    decimação alta, que só vê as frequências baixas (até a Nyquist decimada). A faixa
+    pedida é dividida assim: o primeiro segmento usa a maior decimação necessária para a
+    RBW pedida e cobre [0, margem x Nyquist]; cada segmento seguinte usa metade da
+    decimação e cobre o trecho acima do anterior, com RBW proporcionalmente maior.
+    Os espectros são normalizados (dBV de pico), então os segmentos se encaixam.
+
+    Os planos de cada segmento (decimação, motor de FFT, faixa de bins) são calculados uma
+    vez. varrer() pode atualizar só alguns segmentos; os demais mantêm o último resultado.
+    Não há detecção automática de segmentos inalterados: quem chama escolhe quais atualizar.
+    Enquanto um segmento é processado, o próximo já está sendo capturado.
+
+    Se o trigger de um segmento não vier a tempo, o segmento é armado de novo; esgotadas as
+    tentativas, varrer() levanta TimeoutError em vez de usar o buffer antigo.
+    """
+
+    def __init__(self, rp, inicio, fim, rbw, canais=(1,), window='hanning', welch=True,
+                 margem=0.8, n_amostras=16384, tentativas=3):
+        """
+        Args:
+            rp (scpi): Conexão com a Red Pitaya (redpitaya_scpi.scpi).
+            inicio (float): Frequência inicial em Hz.
+            fim (float): Frequência final em Hz.
+            rbw (float): RBW desejada em Hz.
+            canais (tuple, opcional): Canais varridos. Padrão (1,).
+            window (str, opcional): Janela do numpy. Padrão 'hanning'.
+            welch (bool, opcional): Usa Welch nos segmentos em que a RBW é maior que a resolução do buffer. Padrão True.
+            margem (float, opcional): Fração da Nyquist usada em cada segmento (o filtro de decimação atenua perto dela). Padrão 0.8.
+            n_amostras (int, opcional): Tamanho do buffer de aquisição. Padrão 16384.
+            tentativas (int, opcional): Quantas vezes um segmento é armado antes de desistir. Padrão 3.
+        """
+        assert 0 <= inicio < fim, "Faixa de frequência inválida"
+        self.rp = rp
+        self.canais = list(canais)
+        self.sample_rate = rp.sample_rate     # Taxa do ADC antes da decimação (depende da placa)
+        self.n_amostras = n_amostras
+        self.tentativas = max(1, tentativas)
+        self.segmentos = []
+
+        # Maior decimação necessária (potência de 2, até 65536)
+        decimacao = 1
+        while decimacao < 65536 and self.sample_rate / (decimacao * n_amostras) > rbw:
+            decimacao *= 2
+
+        f_lo = 0.0
+        while f_lo < fim:
+            fs = self.sample_rate / decimacao
+            f_hi = fs / 2 if decimacao == 1 else margem * fs / 2
+            if f_hi > inicio:
+                motor = SpectrumEngine(max(rbw, fs / n_amostras), fs, window, normalizar=True, welch=welch)
+                freq = motor.frequencias(n_amostras)
+                selecao = np.flatnonzero((freq >= max(f_lo, inicio)) & (freq < min(f_hi, fim)))
+                self.segmentos.append({'decimacao': decimacao, 'motor': motor, 'selecao': selecao,
+                                       'freq': freq[selecao], 'rbw': motor.sample_rate / motor.n_rbw})
+            if decimacao == 1:
+                break
+            f_lo = f_hi
+            decimacao //= 2
+
+        # Eixo de frequência e resultado da varredura inteira; cada segmento escreve na sua fatia
+        inicio_fatia = 0
+        for seg in self.segmentos:
+            seg['fatia'] = slice(inicio_fatia, inicio_fatia + len(seg['selecao']))
+            inicio_fatia = seg['fatia'].stop
+        self.freq = np.concatenate([seg['freq'] for seg in self.segmentos])
+        self.db = np.full((len(self.canais), len(self.freq)), np.nan)
+        self._dados = None
+
+    def _armar(self, seg):
+        # Configura a decimação do segmento e dispara a aquisição (uma única escrita)
+        with self.rp.pipeline():
+            self.rp.acq_set(dec=seg['decimacao'])
+            self.rp.tx_txt('ACQ:START')
+            self.rp.tx_txt('ACQ:TRIG NOW')
+
+    def varrer(self, segmentos=None):
+        """
+        Faz uma varredura.
+
+        Args:
+            segmentos (list(int), opcional): Índices dos segmentos a atualizar; os outros mantêm
+                o resultado da varredura anterior. Padrão: todos (nada é reaproveitado).
+
+        Returns:
+            (ndarray, ndarray): Frequências em Hz e amplitude em dBV (canais, bins).
+                Os arrays são reaproveitados entre varreduras.
+
+        Raises:
+            TimeoutError: Se um segmento não disparar em nenhuma das tentativas.
+        """
+        ativos = [self.segmentos[i] for i in (range(len(self.segmentos)) if segmentos is None else segmentos)]
+        if not ativos:
+            return self.freq, self.db
+
+        self._armar(ativos[0])
+        for i, seg in enumerate(ativos):
+            tempo_buffer = self.n_amostras * seg['decimacao'] / self.sample_rate
+            for tentativa in range(self.tentativas):
+                if tentativa:
+                    self._armar(seg)
+                disparou, _ = self.rp.wait_triggered(2 * tempo_buffer + 0.5)
+                if disparou:
+                    break
+            else:
+                # O buffer ainda tem a captura anterior (outra decimação): não pode entrar no espectro
+                raise TimeoutError(f"Segmento com decimação {seg['decimacao']} não disparou "
+                                   f"em {self.tentativas} tentativas")
+            self._dados = self.rp.acq_data_multi(self.canais, out=self._dados)
+
+            # O próximo segmento já captura enquanto este é processado
+            if i + 1 < len(ativos):
+                self._armar(ativos[i + 1])
+
+            _, db = seg['motor'].calcular(self._dados)
+            self.db[:, seg['fatia']] = db[:, seg['selecao']]
+
+        return self.freq, self.db
+
+class Waterfall (object):
+    """
+    Histórico de espectros (espectrograma / waterfall) com memória fixa.
+
+    As linhas ficam num buffer circular float32 (linhas x bins) guardado duas vezes seguidas,
+    então as últimas linhas sempre formam um bloco contíguo: ultimas() devolve uma visão,
+    sem cópia, pronta para imshow ou np.save. Cada linha tem também o seu instante (time.time()).
+
+    Com fator > 1, as linhas que saem do buffer são reduzidas de `fator` em `fator` (média
+    ou máximo) e guardadas num segundo Waterfall em `antigo`, que cobre um tempo `fator`
+    vezes maior com a mesma memória.
+    """
+
+    def __init__(self, bins, linhas=1000, fator=None, linhas_antigas=None, reducao='media'):
+        """
+        Args:
+            bins (int): Número de pontos de cada espectro.
+            linhas (int, opcional): Número de espectros guardados. Padrão 1000.
+            fator (int, opcional): Quantas linhas antigas viram uma linha do histórico decimado. Padrão None (sem histórico).
+            linhas_antigas (int, opcional): Tamanho do histórico decimado. Padrão: igual a linhas.
+            reducao (str, opcional): 'media' ou 'max' na decimação. Padrão 'media'.
+        """
+        assert reducao in ('media', 'max'), "Redução deve ser 'media' ou 'max'"
+        self.bins = bins
+        self.linhas = linhas
+        self.reducao = reducao
+        self._dados = np.full((2 * linhas, bins), np.nan, dtype=np.float32)
+        self._tempos = np.full(2 * linhas, np.nan)
+        self._pos = 0
+        self.contagem = 0
+
+        self.fator = fator if fator is not None and fator > 1 else None
+        self.antigo = None
+        if self.fator is not None:
+            self.antigo = Waterfall(bins, linhas_antigas or linhas, reducao=reducao)
+            self._acumulado = np.zeros(bins)
+            self._n_acumulado = 0
+            self._tempo_acumulado = 0.0
+
+    def __len__(self):
+        return min(self.contagem, self.linhas)
+
+    def adicionar(self, espectro, tempo=None):
+        """Acrescenta um espectro (bins,); o mais antigo é descartado (ou decimado) quando o buffer está cheio."""
+        espectro = np.asarray(espectro)
+        if espectro.shape != (self.bins,):
+            raise ValueError(f"Espectro com formato {espectro.shape}, esperado ({self.bins},)")
+        tempo = time.time() if tempo is None else tempo
+
+        if self.antigo is not None and self.contagem >= self.linhas:
+            self._decimar(self._pos)
+
+        # Escreve nas duas cópias
+        self._dados[self._pos] = espectro
+        self._dados[self._pos + self.linhas] = espectro
+        self._tempos[self._pos] = tempo
+        self._tempos[self._pos + self.linhas] = tempo
+        self._pos = (self._pos + 1) % self.linhas
+        self.contagem += 1
+
+    def _decimar(self, indice):
+        # Acumula a linha que vai ser sobrescrita; a cada `fator` linhas, passa uma para o histórico
+        linha = self._dados[indice]
+        if self.reducao == 'max' and self._n_acumulado:
+            np.maximum(self._acumulado, linha, out=self._acumulado)
+        elif self.reducao == 'max':
+            self._acumulado[...] = linha
+        else:
+            self._acumulado += linha
+        self._tempo_acumulado += self._tempos[indice]
+        self._n_acumulado += 1
+
+        if self._n_acumulado == self.fator:
+            if self.reducao == 'media':
+                self._acumulado /= self.fator
+            self.antigo.adicionar(self._acumulado, self._tempo_acumulado / self.fator)
+            self._acumulado[...] = 0
+            self._n_acumulado = 0
+            self._tempo_acumulado = 0.0
+
+    def ultimas(self, n=None):
+        """Visão (sem cópia) das últimas n linhas, da mais antiga para a mais nova. Padrão: todas."""
+        n = len(self) if n is None else min(n, len(self))
+        fim = self._pos + self.linhas
+        return self._dados[fim - n:fim]
+
+    def tempos(self, n=None):
+        """Instantes das últimas n linhas (mesma ordem de ultimas())."""
+        n = len(self) if n is None else min(n, len(self))
+        fim = self._pos + self.linhas
+        return self._tempos[fim - n:fim]
+
+    def salvar(self, arquivo, freq=None):
+        """Salva o histórico (e o decimado, se houver) num arquivo .npz."""
+        dados = {'espectros': self.ultimas(), 'tempos': self.tempos()}
+        if freq is not None:
+            dados['freq'] = freq
+        if self.antigo is not None:
+            dados['espectros_antigos'] = self.antigo.ultimas()
+            dados['tempos_antigos'] = self.antigo.tempos()
+        np.savez(arquivo, **dados)
+
+
+# Estado de cada processo do DspPool (preenchido por _iniciar_worker)
+_worker = {}
+
+def _iniciar_worker(nome, formato, dtype, funcao):
+    """Conecta o processo ao bloco de memória compartilhada do DspPool."""
+    try:
+        shm = shared_memory.SharedMemory(name=nome, track=False)
+    except TypeError:
+        # Python < 3.13: o registro repete o do DspPool no mesmo resource_tracker,
+        # e o bloco só é apagado por DspPool.fechar()
+        shm = shared_memory.SharedMemory(name=nome)
+    _worker['shm'] = shm
+    _worker['blocos'] = np.ndarray(formato, dtype=dtype, buffer=shm.buf)
+    _worker['funcao'] = funcao
+
+def _processar(slot):
+    """Aplica a função do DspPool ao bloco guardado em `slot`."""
+    return _worker['funcao'](_worker['blocos'][slot])
+
+class DspPool (object):
+    """
+    Distribui o processamento de quadros entre vários processos.
+
+    Os quadros são copiados para um anel de `slots` blocos em memória compartilhada
+    (multiprocessing.shared_memory) e só o índice do slot vai para o worker, então as
+    amostras não são serializadas. Cada worker recebe a função uma única vez (na criação
+    do processo) e devolve o resultado dela, que volta pelo pickle normal.
+
+        espectro = SpectrumEngine(RBW, sample_rate, welch=True)
+        with DspPool(espectro.calcular, (4, 16384)) as pool:
+            for freq, fft_db in pool.mapear(quadros):    # resultados na ordem dos quadros
+                ...
+
+    A função precisa ser serializável (função de módulo, método de um objeto como o
+    SpectrumEngine ou functools.partial) e não deve depender de estado entre quadros:
+    cada worker tem a sua cópia, então médias entre quadros (set_media) devem ser feitas
+    por quem recebe os resultados. O bloco chega ao worker como ndarray simples, sem os
+    metadados de AcqData; a taxa de amostragem deve estar na própria função.
+    """
+
+    def __init__(self, funcao, formato, dtype=np.float32, processos=None, slots=None):
+        """
+        Args:
+            funcao (callable): Função aplicada a cada quadro; recebe um ndarray com formato `formato`.
+            formato (tuple): Formato de cada quadro, ex. (canais, amostras).
+            dtype (dtype, opcional): Tipo das amostras. Padrão float32 (o dos dados adquiridos).
+            processos (int, opcional): Número de processos. Padrão: os.cpu_count().
+            slots (int, opcional): Quadros em processamento ao mesmo tempo. Padrão: 2 por processo.
+        """
+        self.processos = processos or os.cpu_count() or 1
+        self.slots = slots or 2 * self.processos
+        self.formato = tuple(formato)
+        self.dtype = np.dtype(dtype)
+
+        tamanho = self.slots * int(np.prod(self.formato)) * self.dtype.itemsize
+        self._shm = shared_memory.SharedMemory(create=True, size=max(tamanho, 1))
+        self._blocos = np.ndarray((self.slots,) + self.formato, dtype=self.dtype, buffer=self._shm.buf)
+
+        self._livres = queue.Queue()
+        for slot in range(self.slots):
+            self._livres.put(slot)
+
+        self._executor = ProcessPoolExecutor(
+            self.processos,
+            initializer=_iniciar_worker,
+            initargs=(self._shm.name, (self.slots,) + self.formato, self.dtype, funcao)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.fechar()
+
+    def submeter(self, quadro):
+        """
+        Copia o quadro para um slot livre (esperando um liberar, se preciso) e agenda o processamento.
+
+        Returns:
+            Future com o resultado da função.
+        """
+        quadro = np.asarray(quadro)
+        if quadro.shape != self.formato:
+            raise ValueError(f"Quadro com formato {quadro.shape}, esperado {self.formato}")
+
+        slot = self._livres.get()
+        self._blocos[slot] = quadro
+        try:
+            futuro = self._executor.submit(_processar, slot)
+        except Exception:
+            self._livres.put(slot)
+            raise
+        # O slot volta para o anel assim que o worker termina de usá-lo
+        futuro.add_done_callback(lambda _, slot=slot: self._livres.put(slot))
+        return futuro
+
+    def mapear(self, quadros):
+        """
+        Processa uma sequência (ou gerador) de quadros e devolve os resultados na mesma ordem.
+
+        No máximo `slots` quadros ficam em processamento; o próximo quadro só é lido do
+        gerador quando há espaço, então a aquisição pode alimentar o pool diretamente.
+        """
+        pendentes = deque()
+        try:
+            for quadro in quadros:
+                if len(pendentes) >= self.slots:
+                    yield pendentes.popleft().result()
+                pendentes.append(self.submeter(quadro))
+            while pendentes:
+                yield pendentes.popleft().result()
+        finally:
+            for futuro in pendentes:
+                futuro.cancel()
+
+    def fechar(self):
+        """Encerra os processos e libera a memória compartilhada."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._blocos = None
+        self._shm.close()
+        self._shm.unlink()
@@ -4,6 +4,7 @@ import redpitaya_scpi as scpi
 import matplotlib.pyplot as plt
 import numpy as np
 from datetime import datetime
+import RedpitayaMath as rpmath
 
 IP = '10.42.0.25'
 rp_s = scpi.scpi(IP)
@@ -18,17 +19,20 @@ ts = 1 / sample_rate
 RBW = 100e3  # 100 kHz de RBW inicial
 MIN_RBW = 1e3  # 1 kHz - mínimo RBW
 MAX_RBW = 1e6  # 1 MHz - máximo RBW
+espectro = rpmath.SpectrumEngine(RBW, sample_rate, welch=True)  # Welch: usa o buffer inteiro em qualquer RBW
+zoom = None  # (centro, span) em Hz quando o modo zoom está ativo
 
 # Configuração de atenuação para cada canal
 MIN_ATT = 0
 MAX_ATT = 20
 atenuacao = [0, 0, 0, 0]  # Atenuação para cada canal [CH1, CH2, CH3, CH4]
 
-# Configuração inicial
-rp_s.tx_txt('ACQ:RST')
-rp_s.tx_txt('ACQ:DEC 1')
-rp_s.tx_txt('ACQ:TRIG:LEV 0')
-rp_s.tx_txt('ACQ:TRIG:DLY 0')
+# Configuração inicial (comandos enviados em uma única escrita)
+with rp_s.pipeline():
+    rp_s.acq_reset()
+    rp_s.acq_set(dec=1)
+    rp_s.acq_trig_set(trig_lvl=0, trig_delay=0)
+    rp_s.acq_set_fast_mode()  # Dados binários RAW, convertidos para Volts no computador
 
 # Configuração dos subplots
 plt.ion()
@@ -38,6 +42,10 @@ colors = ['r', 'g', 'b', 'm']
 lines = []
 frequencias = None
 
+# Aquisição em segundo plano: a próxima captura é armada enquanto o espectro anterior
+# é calculado e desenhado. Comandos enviados durante a execução usam aquisicao.lock.
+aquisicao = scpi.Acquirer(rp_s, [1, 2, 3, 4], trigger='CH1_PE', timeout=0.5, interval=intervalo_segundos)
+
 # Inicializa gráficos para cada canal
 for i in range(4):
     row, col = divmod(i, 2)
@@ -53,29 +61,12 @@ for i in range(4):
 
 plt.tight_layout()
 
-def calcular_fft(sinal, rbw):
-    n = len(sinal)
-    
-    # Calcula o tamanho necessário da FFT para atingir a RBW desejada
-    n_rbw = int(sample_rate / rbw)
-    n_rbw = min(n_rbw, n)  # Não pode ser maior que o buffer
-    n_rbw = max(n_rbw, 2)  # Pelo menos 2 pontos
-    
-    # Recorta o sinal para o novo tamanho
-    sinal_recortado = sinal[:n_rbw]
-    
-    window = np.hanning(n_rbw)
-    fft_result = np.fft.fft(sinal_recortado * window)
-    fft_freq = np.fft.fftfreq(n_rbw, d=ts)[:n_rbw//2]
-    fft_db = 20 * np.log10(np.abs(fft_result[:n_rbw//2]) + 1e-10)
-    
-    return fft_freq, fft_db
-
 def set_attenuation(channel, att_db):
     """Configura a atenuação para um canal específico"""
     global atenuacao
     if MIN_ATT <= att_db <= MAX_ATT:
-        rp_s.tx_txt(f'ACQ:SOUR{channel}:GAIN {"LV" if att_db == 0 else "HV"}')
+        with aquisicao.lock:
+            rp_s.set_attenuation(channel, att_db)
         atenuacao[channel-1] = att_db
         fig.suptitle(f'Spectrum Analyzer - 4 Canais\nRBW: {RBW/1e3:.1f} kHz | Atenuação: {atenuacao}', fontsize=16)
         print(f"Atenuação do CH{channel} configurada para {att_db}dB")
@@ -84,21 +75,32 @@ def set_attenuation(channel, att_db):
         print(f"Atenuação {att_db}dB não suportada. Use entre {MIN_ATT} e {MAX_ATT} dB")
         return False
 
-def ler_canal(canal):
-    """Lê os dados de um canal específico"""
-    rp_s.tx_txt(f'ACQ:SOUR{canal}:DATA?')
-    data_str = rp_s.rx_txt().strip('{}\n\r').replace("  ", "").split(',')
-    return np.array(list(map(float, data_str)))
+def atualizar_zoom(centro=None, span=None):
+    """Ativa o modo zoom (centro ± span/2) ou volta para a faixa completa"""
+    global zoom
+    if centro is None:
+        zoom = None
+        inicio, fim = 0, sample_rate/2
+        ticks = np.arange(0, sample_rate/2/1e6, 5)
+        print("\nZoom desativado")
+    else:
+        zoom = (centro, span)
+        inicio, fim = centro - span/2, centro + span/2
+        ticks = np.linspace(inicio/1e6, fim/1e6, 5)
+        print(f"\nZoom: {centro/1e6:.3f} MHz ± {span/2e3:.1f} kHz")
+    for ax in axs.flat:
+        ax.set_xlim(inicio/1e6, fim/1e6)  # MHz
+        ax.set_xticks(ticks)
 
 def atualizar_rbw(nova_rbw):
     """Atualiza o valor de RBW"""
     global RBW
     RBW = max(MIN_RBW, min(nova_rbw, MAX_RBW))
+    espectro.set_rbw(RBW)
     fig.suptitle(f'Spectrum Analyzer - 4 Canais\nRBW: {RBW/1e3:.1f} kHz | Atenuação: {atenuacao}', fontsize=16)
     print(f"\nRBW alterada para: {RBW/1e3:.1f} kHz")
 
 start_time = time.time()
-next_acquisition = start_time
 
 try:
     print("Iniciando aquisição nos 4 canais...")
@@ -106,41 +108,36 @@ try:
     print("Comandos disponíveis durante a execução:")
     print(" - 'rbw X' para alterar RBW (ex: 'rbw 10' para 10kHz)")
     print(" - 'att C X' para alterar atenuação (ex: 'att 1 20' para 20dB no CH1)")
+    print(" - 'zoom F S' para ver só F MHz ± S/2 kHz (ex: 'zoom 10 500'), 'zoom off' para voltar")
     
     # APLICA A ATENUAÇÃO INICIAL PARA TODOS OS CANAIS
-    for ch in range(4):
-        set_attenuation(ch+1, atenuacao[ch])
+    with rp_s.pipeline():
+        for ch in range(4):
+            set_attenuation(ch+1, atenuacao[ch])
     
+    aquisicao.start()
     while time.time() - start_time < tempo_total_segundos:
-        if time.time() >= next_acquisition:
+        quadro = aquisicao.get(timeout=0)  # Quadro mais recente, se já houver um pronto
+        if quadro is not None:
+            _, _, dados = quadro
             print(f"\nAquisição em {datetime.now().strftime('%H:%M:%S')} - RBW: {RBW/1e3:.1f} kHz - Atenuação: {atenuacao}")
             
-            rp_s.tx_txt('ACQ:START')
-            rp_s.tx_txt('ACQ:TRIG CH1_PE')
-            
-            # Espera trigger
-            trigger_timeout = time.time() + 0.5
-            while True:
-                rp_s.tx_txt('ACQ:TRIG:STAT?')
-                if rp_s.rx_txt() == 'TD' or time.time() > trigger_timeout:
-                    break
+            # Calcula os 4 espectros numa única FFT
+            if zoom is None:
+                freq, fft_db = espectro.calcular(dados)
+            else:
+                freq, fft_db = espectro.calcular_zoom(dados, *zoom)
+            frequencias = freq
+            freq_mhz = freq/1e6  # Converte para MHz
             
-            # Processa todos os 4 canais
             for ch in range(4):
-                data = ler_canal(ch+1)
-                
-                freq, fft_db = calcular_fft(data, RBW)
-                if frequencias is None:
-                    frequencias = freq
-                
-                lines[ch].set_data(freq/1e6, fft_db)  # Converte para MHz
+                lines[ch].set_data(freq_mhz, fft_db[ch])
             
             fig.canvas.flush_events()
-            next_acquisition += intervalo_segundos
         
         # Verifica se usuário quer alterar configurações
         if plt.waitforbuttonpress(0.05):
-            cmd = input("\nDigite comando (rbw X / att C X): ").strip().lower()
+            cmd = input("\nDigite comando (rbw X / att C X / zoom F S): ").strip().lower()
             try:
                 if cmd.startswith('rbw'):
                     nova_rbw = float(cmd.split()[1]) * 1e3
@@ -153,18 +150,26 @@ try:
                         set_attenuation(canal, att)
                     else:
                         print("Canal inválido. Use 1-4.")
+                elif cmd.startswith('zoom'):
+                    parts = cmd.split()
+                    if parts[1] == 'off':
+                        atualizar_zoom()
+                    else:
+                        atualizar_zoom(float(parts[1]) * 1e6, float(parts[2]) * 1e3)
                 else:
                     print("Comando desconhecido")
             except:
                 print("Formato inválido. Use:")
                 print(" - 'rbw X' para alterar RBW (ex: 'rbw 10')")
                 print(" - 'att C X' para alterar atenuação (ex: 'att 1 20')")
+                print(" - 'zoom F S' para o modo zoom (ex: 'zoom 10 500') ou 'zoom off'")
         
         plt.pause(0.05)
 
 except KeyboardInterrupt:
     print("\nAquisição interrompida pelo usuário")
 finally:
+    aquisicao.stop()
     rp_s.tx_txt('ACQ:STOP')
     rp_s.close()
     plt.ioff()
@@ -20,16 +20,19 @@ canal = 1 # digite o n° (de 1 a 4) do canal desejado
 RBW = 100e3  # 100 kHz de RBW inicial
 MIN_RBW = 1e3  # 1 kHz - mínimo RBW
 MAX_RBW = 1e6  # 1 MHz - máximo RBW
+espectro = rpmath.SpectrumEngine(RBW, sample_rate, welch=True)  # Welch: usa o buffer inteiro em qualquer RBW
 atenuacao = 0 # digite a atenuação desejada
 MIN_ATT = 0
 MAX_ATT = 20
+LINHAS_WATERFALL = 600  # Espectros recentes no waterfall (memória fixa)
+FATOR_HISTORICO = 10  # Espectros mais antigos são guardados em médias de 10
 
 # Configuração inicial
 rp_s.__configure__()
 
 # Configuração do gráfico
 plt.ion()
-fig, ax = plt.subplots(figsize=(15, 7))
+fig, (ax, ax_wf) = plt.subplots(2, 1, figsize=(15, 10), gridspec_kw={'height_ratios': [2, 1]})
 fig.suptitle(f'Spectrum Analyzer | Canal {canal}\nRBW: {RBW/1e3:.1f} kHz| Atenuação: {atenuacao}', fontsize=16)
 
 # Linha do espectro
@@ -42,6 +45,12 @@ ax.set_ylabel('Amplitude (dB)')
 ax.grid(True)
 ax.legend()
 
+# Waterfall (espectros ao longo do tempo); criado na primeira aquisição, quando o número de bins é conhecido
+historico = None
+imagem_wf = None
+ax_wf.set_xlabel('Frequência (MHz)')
+ax_wf.set_ylabel('Aquisições atrás')
+
 plt.tight_layout()
 
 start_time = time.time()
@@ -59,17 +68,23 @@ try:
             rp_s.tx_txt(f'ACQ:TRIG CH{canal}_PE')
             
             # Espera trigger
-            trigger_timeout = time.time() + 0.5
-            while True:
-                rp_s.tx_txt('ACQ:TRIG:STAT?')
-                if rp_s.rx_txt() == 'TD' or time.time() > trigger_timeout:
-                    break
+            rp_s.wait_triggered(0.5)
             
             # Adquire dados do canal
             data = rp_s.ler_canal(canal)
             
             # Calcula FFT com RBW atual
-            freq, fft_db = rpmath.calcular_fft(data, RBW)
+            freq, fft_db = espectro.calcular(data)
+            
+            # Guarda no histórico e atualiza o waterfall (visão do buffer, sem cópia)
+            if historico is None:
+                historico = rpmath.Waterfall(len(freq), LINHAS_WATERFALL, fator=FATOR_HISTORICO)
+                imagem_wf = ax_wf.imshow(historico.ultimas(), aspect='auto', origin='upper', cmap='viridis',
+                                         vmin=-80, vmax=80, extent=(freq[0]/1e6, freq[-1]/1e6, 0, 1))
+            historico.adicionar(fft_db)
+            linhas_wf = historico.ultimas()
+            imagem_wf.set_data(linhas_wf[::-1])
+            imagem_wf.set_extent((freq[0]/1e6, freq[-1]/1e6, len(linhas_wf), 0))
             
             # Atualiza gráfico
             line.set_data(freq/1e6, fft_db)
@@ -83,5 +98,7 @@ except KeyboardInterrupt:
 finally:
     rp_s.tx_txt('ACQ:STOP')
     rp_s.close()
+    if historico is not None:
+        historico.salvar(f"waterfall_canal{canal}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.npz", freq)
     plt.ioff()
     plt.show()
\ No newline at end of file
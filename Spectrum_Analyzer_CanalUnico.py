@@ -4,6 +4,7 @@ import redpitaya_scpi as scpi
 import matplotlib.pyplot as plt
 import numpy as np
 from datetime import datetime
+import RedpitayaMath as rpmath
 
 IP = '10.42.0.25'
 rp_s = scpi.scpi(IP)
@@ -19,6 +20,8 @@ canal = 1  # digite o n° (de 1 a 4) do canal desejado
 RBW = 100e3  # 100 kHz de RBW inicial
 MIN_RBW = 1e3  # 1 kHz - mínimo RBW
 MAX_RBW = 1e6  # 1 MHz - máximo RBW
+espectro = rpmath.SpectrumEngine(RBW, sample_rate, welch=True)  # Welch: usa o buffer inteiro em qualquer RBW
+varredura = None  # SweptSpectrum quando o modo varredura (RBW abaixo de MIN_RBW) está ativo
 atenuacao = 0  # digite a atenuação desejada
 MIN_ATT = 0
 MAX_ATT = 20
@@ -43,29 +46,11 @@ ax.legend()
 
 plt.tight_layout()
 
-def calcular_fft(sinal, rbw):
-    n = len(sinal)
-    
-    # Calcula o tamanho necessário da FFT para atingir a RBW desejada
-    n_rbw = int(sample_rate / rbw)
-    n_rbw = min(n_rbw, n)  # Não pode ser maior que o buffer
-    n_rbw = max(n_rbw, 2)  # Pelo menos 2 pontos
-    
-    # Recorta o sinal para o novo tamanho
-    sinal_recortado = sinal[:n_rbw]
-    
-    window = np.hanning(n_rbw)
-    fft_result = np.fft.fft(sinal_recortado * window)
-    fft_freq = np.fft.fftfreq(n_rbw, d=ts)[:n_rbw//2]
-    fft_db = 20 * np.log10(np.abs(fft_result[:n_rbw//2]) + 1e-10)
-    
-    return fft_freq, fft_db
-
 def set_attenuation(channel, att_db):
     """Configura a atenuação para um canal específico"""
     global atenuacao
     if MIN_ATT <= att_db <= MAX_ATT:
-        rp_s.tx_txt(f'ACQ:SOUR{channel}:GAIN {"LV" if att_db == 0 else "HV"}')
+        rp_s.set_attenuation(channel, att_db)
         atenuacao = att_db
         fig.suptitle(f'Spectrum Analyzer | Canal {canal}\nRBW: {RBW/1e3:.1f} kHz | Atenuação: {atenuacao}dB', fontsize=16)
         print(f"Atenuação do CH{channel} configurada para {att_db}dB")
@@ -74,11 +59,20 @@ def set_attenuation(channel, att_db):
         print(f"Atenuação {att_db}dB não suportada. Use entre {MIN_ATT} e {MAX_ATT} dB")
         return False
 
-def ler_canal(canal):
-    """Lê os dados de um canal específico"""
-    rp_s.tx_txt(f'ACQ:SOUR{canal}:DATA?')
-    data_str = rp_s.rx_txt().strip('{}\n\r').replace("  ", "").split(',')
-    return np.array(list(map(float, data_str)))
+def set_varredura(inicio=None, fim=None, rbw=None):
+    """Ativa o modo varredura (inicio-fim em Hz com RBW fina) ou volta ao modo normal"""
+    global varredura
+    if inicio is None:
+        varredura = None
+        rp_s.acq_set(dec=1)
+        ax.set_xlim(0, sample_rate/2/1e6)
+        print("\nVarredura desativada")
+    else:
+        varredura = rpmath.SweptSpectrum(rp_s, inicio, fim, rbw, canais=[canal])
+        ax.set_xlim(inicio/1e6, fim/1e6)
+        print(f"\nVarredura de {inicio/1e3:.1f} a {fim/1e3:.1f} kHz em {len(varredura.segmentos)} segmentos "
+              f"(RBW de {varredura.segmentos[0]['rbw']:.1f} a {varredura.segmentos[-1]['rbw']:.1f} Hz)")
+    ax.set_xticks(np.linspace(*ax.get_xlim(), 6))
 
 start_time = time.time()
 next_acquisition = start_time
@@ -87,6 +81,7 @@ try:
     print(f"Iniciando aquisição no canal {canal}...")
     print("Pressione Ctrl+C para parar")
     print("Durante a execução, digite 'att X' para alterar a atenuação")
+    print("ou 'sweep I F R' para varrer de I a F kHz com RBW de R Hz ('sweep off' para voltar)")
     
     # APLICA A ATENUAÇÃO INICIAL
     set_attenuation(canal, atenuacao)
@@ -95,21 +90,27 @@ try:
         if time.time() >= next_acquisition:
             print(f"\nAquisição em {datetime.now().strftime('%H:%M:%S')} - RBW: {RBW/1e3:.1f} kHz - Atenuação: {atenuacao}dB")
             
-            rp_s.tx_txt('ACQ:START')
-            rp_s.tx_txt(f'ACQ:TRIG CH{canal}_PE')
-            
-            # Espera trigger
-            trigger_timeout = time.time() + 0.5
-            while True:
-                rp_s.tx_txt('ACQ:TRIG:STAT?')
-                if rp_s.rx_txt() == 'TD' or time.time() > trigger_timeout:
-                    break
-            
-            # Adquire dados do canal
-            data = ler_canal(canal)
-            
-            # Calcula FFT com RBW atual
-            freq, fft_db = calcular_fft(data, RBW)
+            if varredura is not None:
+                # Varredura com decimações diferentes (um segmento capturado enquanto o anterior é processado)
+                freq, fft_db = varredura.varrer()
+                fft_db = fft_db[0]
+            else:
+                rp_s.tx_txt('ACQ:START')
+                rp_s.tx_txt(f'ACQ:TRIG CH{canal}_PE')
+                
+                # Espera trigger
+                rp_s.wait_triggered(0.5)
+                
+                # Adquire dados do canal
+                data = rp_s.ler_canal(canal)
+                
+                # Calcula FFT com RBW atual
+                freq, fft_db = espectro.calcular(data)
+                
+                # Medidas do espectro
+                medidas = espectro.medir(freq, fft_db)
+                print(f"Fundamental: {medidas['fundamental_freq']/1e6:.4f} MHz ({medidas['fundamental_db']:.1f} dB) | "
+                      f"SNR: {medidas['snr_db']:.1f} dB | SFDR: {medidas['sfdr_db']:.1f} dBc | THD: {medidas['thd_db']:.1f} dBc")
             
             # Atualiza gráfico
             line.set_data(freq/1e6, fft_db)
@@ -118,13 +119,22 @@ try:
         
         # Verifica se usuário quer alterar atenuação
         if plt.waitforbuttonpress(0.05):
-            cmd = input("\nDigite 'att X' para alterar atenuação: ").strip().lower()
+            cmd = input("\nDigite 'att X' para alterar atenuação ou 'sweep I F R' para varrer: ").strip().lower()
             if cmd.startswith('att'):
                 try:
                     nova_attenuacao = int(cmd.split()[1])
                     set_attenuation(canal, nova_attenuacao)
                 except:
                     print("Formato inválido. Use 'att X' (ex: 'att 20')")
+            elif cmd.startswith('sweep'):
+                try:
+                    parts = cmd.split()
+                    if parts[1] == 'off':
+                        set_varredura()
+                    else:
+                        set_varredura(float(parts[1]) * 1e3, float(parts[2]) * 1e3, float(parts[3]))
+                except:
+                    print("Formato inválido. Use 'sweep I F R' (ex: 'sweep 0 500 100') ou 'sweep off'")
         
         plt.pause(0.05)
 
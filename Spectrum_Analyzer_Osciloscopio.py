@@ -4,6 +4,7 @@ import redpitaya_scpi as scpi
 import matplotlib.pyplot as plt
 import numpy as np
 from datetime import datetime
+import RedpitayaMath as rpmath
 
 IP = '10.42.0.25'
 rp_s = scpi.scpi(IP)
@@ -18,6 +19,7 @@ ts = 1 / sample_rate       # Período de amostragem
 RBW = 100e3  # Resolution Bandwidth inicial (100 kHz)
 MIN_RBW = 1e3  # 1 kHz
 MAX_RBW = 1e6  # 1 MHz
+espectro = rpmath.SpectrumEngine(RBW, sample_rate, welch=True)  # Welch: usa o buffer inteiro em qualquer RBW
 
 # Configuração de Atenuação
 ATENUACAO_OPCOES = [0, 20]  # 0dB ou 20dB
@@ -30,10 +32,10 @@ global_max = float('-inf')
 global_min = float('inf')
 
 # Configuração inicial
-rp_s.tx_txt('ACQ:RST')
-rp_s.tx_txt('ACQ:DEC 1')
-rp_s.tx_txt('ACQ:TRIG:LEV 0')
-rp_s.tx_txt('ACQ:TRIG:DLY 0')
+rp_s.acq_reset()
+rp_s.acq_set(dec=1)
+rp_s.acq_trig_set(trig_lvl=0, trig_delay=0)
+rp_s.acq_set_fast_mode()  # Dados binários RAW, convertidos para Volts no computador
 
 # Configuração da interface
 plt.ion()
@@ -45,6 +47,7 @@ axs_osc = []  # Para os gráficos do osciloscópio
 axs_spec = [] # Para os gráficos do spectrum analyzer
 lines_osc = []
 lines_spec = []
+dados = None  # Buffer (4 canais x amostras) reaproveitado a cada aquisição
 
 for i in range(4):
     # Gráfico do osciloscópio (esquerda)
@@ -72,31 +75,11 @@ for i in range(4):
 
 plt.tight_layout()
 
-def calcular_fft(sinal, rbw):
-    """Calcula a FFT com RBW específica"""
-    n = len(sinal)
-    n_rbw = int(sample_rate / rbw)
-    n_rbw = min(n_rbw, n)
-    n_rbw = max(n_rbw, 2)
-    
-    sinal_recortado = sinal[:n_rbw]
-    window = np.hanning(n_rbw)
-    fft_result = np.fft.fft(sinal_recortado * window)
-    fft_freq = np.fft.fftfreq(n_rbw, d=ts)[:n_rbw//2]
-    fft_db = 20 * np.log10(np.abs(fft_result[:n_rbw//2]) + 1e-10)
-    return fft_freq, fft_db, sinal_recortado
-
-def ler_canal(canal):
-    """Lê os dados de um canal específico"""
-    rp_s.tx_txt(f'ACQ:SOUR{canal}:DATA?')
-    data_str = rp_s.rx_txt().strip('{}\n\r').replace("  ", "").split(',')
-    return np.array(list(map(float, data_str)))
-
 def set_attenuation(channel, att_db):
     """Configura a atenuação para um canal específico"""
     global atenuacao
     if att_db in ATENUACAO_OPCOES:
-        rp_s.tx_txt(f'ACQ:SOUR{channel}:GAIN {"LV" if att_db == 0 else "HV"}')
+        rp_s.set_attenuation(channel, att_db)
         atenuacao[channel-1] = att_db
         return True
     else:
@@ -107,6 +90,7 @@ def atualizar_rbw(nova_rbw):
     """Atualiza o valor de RBW e o título do gráfico"""
     global RBW
     RBW = max(MIN_RBW, min(nova_rbw, MAX_RBW))
+    espectro.set_rbw(RBW)
     fig.suptitle(f'Osciloscópio + Spectrum Analyzer - RBW: {RBW/1e3:.1f} kHz | Atenuação: {atenuacao}', fontsize=16)
     print(f"\nRBW alterada para: {RBW/1e3:.1f} kHz")
 
@@ -130,19 +114,20 @@ try:
             rp_s.tx_txt('ACQ:START')
             
             # Espera trigger
-            trigger_timeout = time.time() + 0.5
-            while True:
-                rp_s.tx_txt('ACQ:TRIG:STAT?')
-                if rp_s.rx_txt() == 'TD' or time.time() > trigger_timeout:
-                    break
+            rp_s.wait_triggered(0.5)
+            
+            # Lê os 4 canais de uma só vez e processa cada um
+            dados = rp_s.acq_data_multi([1, 2, 3, 4], out=dados)
             
-            # Processa todos os 4 canais
+            # Espectros dos 4 canais numa única FFT com a RBW atual
+            freq, fft_db = espectro.calcular(dados)
+            freq_mhz = freq/1e6
             current_maxes = []
             current_mins = []
             
             for ch in range(4):
-                data = ler_canal(ch+1)
-                time_axis = np.arange(len(data)) / sample_rate
+                data = dados[ch]
+                time_axis = data.time_axis()  # Usa a taxa real (com decimação)
                 
                 # Calcula amplitudes máxima e mínima deste canal
                 chan_max = np.max(data)
@@ -153,9 +138,8 @@ try:
                 # Atualiza osciloscópio
                 lines_osc[ch].set_data(time_axis, data)
                 
-                # Atualiza spectrum analyzer com RBW atual
-                freq, fft_db, _ = calcular_fft(data, RBW)
-                lines_spec[ch].set_data(freq/1e6, fft_db)
+                # Atualiza spectrum analyzer
+                lines_spec[ch].set_data(freq_mhz, fft_db[ch])
                 axs_spec[ch].relim()
                 axs_spec[ch].autoscale_view(True, True, True)
             
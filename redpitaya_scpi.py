@@ -2,9 +2,17 @@
 Provides SCPI access to Red Pitaya from host computer.
 """
 
+import asyncio
+import math
 import socket
+import threading
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from enum import Enum
-from typing import List, Optional, Union
+from typing import List, Optional, Sequence, Union
 import numpy as np
 
 __author__ = "Luka Golinar, Iztok Jeras, Miha Gjura"
@@ -134,9 +142,220 @@ class LCRExtShunt(Enum):
     S100K = "S100k"
     S1M = "S1M"
 
+class ErrorPolicy(Enum):
+    """When the SCPI server errors are checked."""
+    IMMEDIATE = "IMMEDIATE"
+    BATCHED = "BATCHED"
+    OFF = "OFF"
+
+class ScpiError(Exception):
+    """Errors reported by the Red Pitaya SCPI server."""
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+class StreamOverrunError(Exception):
+    """Raised by ``AcqStream`` when it cannot keep up with the acquisition."""
+
+def parse_ascii_data(raw: Union[bytes, str], dtype: type = np.float64) -> np.ndarray:
+    """
+    Converts an ASCII data reply (``{v1,v2,...,vn}``) to a numpy array.
+
+    The fields are parsed in C by ``np.fromstring``, without creating a Python object per sample.
+    The number of parsed values is checked against the number of fields in the reply.
+
+    Args:
+        raw (bytes or str): Reply as received from Red Pitaya, with or without the curly brackets.
+        dtype (type, optional): Data type of the returned array. Defaults to ``np.float64``.
+
+    Raises:
+        ValueError: If any field is not a number (an error reply, stray text or a truncated sample),
+            instead of returning a shortened array.
+    """
+    if isinstance(raw, str):
+        raw = raw.strip('{}\n\r ')
+        n_fields = raw.count(',') + 1
+    else:
+        raw = bytes(raw).strip(b'{}\n\r ')
+        n_fields = raw.count(b',') + 1
+    if not raw:
+        return np.empty(0, dtype=dtype)
+    try:
+        with warnings.catch_warnings():
+            # Older NumPy versions only warn (DeprecationWarning) when parsing stops at a bad field
+            warnings.simplefilter('error', DeprecationWarning)
+            data = np.fromstring(raw, dtype=dtype, sep=',')
+    except (ValueError, DeprecationWarning) as error:
+        raise ValueError(f"Malformed ASCII data reply: {error}") from None
+    if data.size != n_fields:
+        raise ValueError(f"Malformed ASCII data reply: parsed {data.size} of {n_fields} values")
+    return data
+
+def raw_to_volts(
+    raw: np.ndarray,
+    gain: Gain = Gain.LV,
+    adc_bits: int = 14,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Converts RAW ADC samples to Volts with a single vectorized multiplication.
+
+    Args:
+        raw (ndarray): RAW samples as returned by Red Pitaya (signed integers).
+        gain (Gain, optional): Input gain of the channel (LV = ±1 V, HV = ±20 V full scale). Defaults to LV.
+        adc_bits (int, optional): ADC resolution in bits. Defaults to 14 (STEMlab 125-14).
+        out (ndarray, optional): Preallocated float array for the result. Defaults to None (new float32 array).
+    """
+    full_scale = 20.0 if gain == Gain.HV else 1.0
+    scale = np.float32(full_scale / 2**(adc_bits - 1))
+    if out is None:
+        out = np.empty(raw.shape, dtype=np.float32)
+    return np.multiply(raw, scale, out=out, casting='unsafe')
+
+def decode_acq_data(
+    payload: Union[bytes, bytearray, memoryview],
+    units: str,
+    data_format: str,
+    gain: Optional[Gain] = None,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Converts one acquisition data reply (binary block payload or ASCII text) to a numpy array.
+
+    Args:
+        payload (bytes): Binary block payload (BIN) or reply text without the delimiter (ASCII).
+        units (str): "VOLTS" or "RAW".
+        data_format (str): "BIN" or "ASCII".
+        gain (Gain, optional): If given, RAW binary samples are converted to Volts with this gain. Defaults to None.
+        out (ndarray, optional): Preallocated array for the samples. Defaults to None.
+    """
+    if data_format == "BIN":
+        if units == "VOLTS":
+            buff = np.frombuffer(payload, dtype='>f4')
+            #buff = [struct.unpack('!f',bytearray(buff_byte[i:i+4]))[0] for i in range(0, len(buff_byte), 4)]
+        else:
+            buff = np.frombuffer(payload, dtype='>i2')
+            #buff = [struct.unpack('!h',bytearray(buff_byte[i:i+2]))[0] for i in range(0, len(buff_byte), 2)]
+            if gain is not None:
+                return raw_to_volts(buff, gain, out=out)
+    else:
+        buff = parse_ascii_data(payload)
+
+    if out is not None:
+        out[...] = buff
+        return out
+    return buff
+
+class AcqData(np.ndarray):
+    """
+    Acquired samples (a numpy array) carrying the acquisition settings they were captured with.
+
+    The settings survive slicing and arithmetic, so FFTs, time axes and timing calculations
+    can use the real sample rate instead of assuming 125 MS/s.
+
+    Attributes:
+        sample_rate (float): Effective sample rate in S/s (ADC rate / decimation).
+        decimation (int): Decimation factor.
+        gain (Gain | tuple): Input gain, one per row for multi-channel blocks. None if unknown.
+        trig_delay (int): Trigger delay in samples. None for data without a trigger (``AcqStream`` blocks).
+    """
+
+    def __new__(
+        cls,
+        data,
+        sample_rate: float = 125e6,
+        decimation: int = 1,
+        gain: Optional[Union[Gain, tuple]] = None,
+        trig_delay: Optional[int] = 0
+    ) -> "AcqData":
+        obj = np.asarray(data).view(cls)
+        obj.sample_rate = sample_rate
+        obj.decimation = decimation
+        obj.gain = gain
+        obj.trig_delay = trig_delay
+        return obj
+
+    def __array_finalize__(self, obj) -> None:
+        self.sample_rate = getattr(obj, 'sample_rate', 125e6)
+        self.decimation = getattr(obj, 'decimation', 1)
+        self.gain = getattr(obj, 'gain', None)
+        self.trig_delay = getattr(obj, 'trig_delay', 0)
+
+    def __array_wrap__(self, arr, context=None, return_scalar=False):
+        # Reductions to a single value (np.max, np.mean, ...) give a plain scalar
+        if arr.ndim == 0:
+            return arr[()]
+        return super().__array_wrap__(arr, context)
+
+    def __reduce__(self):
+        # Keep the metadata when pickled (e.g. sent to another process)
+        constructor, args, state = super().__reduce__()
+        return constructor, args, (state, self.metadata())
+
+    def __setstate__(self, state) -> None:
+        state, metadata = state
+        super().__setstate__(state)
+        self.__dict__.update(metadata)
+
+    def metadata(self) -> dict:
+        """Returns the acquisition settings as keyword arguments for ``AcqData``."""
+        return dict(sample_rate=self.sample_rate, decimation=self.decimation, gain=self.gain, trig_delay=self.trig_delay)
+
+    @property
+    def trigger_index(self) -> int:
+        """
+        Sample index of the trigger in a whole-buffer read (middle of the buffer at zero delay).
+
+        Raises ValueError for data acquired without a trigger (``trig_delay`` is None).
+        """
+        if self.trig_delay is None:
+            raise ValueError("Data was acquired without a trigger; it has no trigger position")
+        return self.shape[-1] // 2 - self.trig_delay
+
+    def time_axis(self, from_trigger: bool = False) -> np.ndarray:
+        """
+        Returns the time of each sample in seconds.
+
+        Args:
+            from_trigger (bool, optional): Measure time from the trigger instead of the first sample.
+                Not available for data without a trigger (see ``trigger_index``). Defaults to False.
+        """
+        t = np.arange(self.shape[-1]) / self.sample_rate
+        if from_trigger:
+            t -= self.trigger_index / self.sample_rate
+        return t
+
+def _track_acq_command(client, msg: str) -> None:
+    """
+    Forgets the acquisition state cached by `client` (``scpi`` or ``AsyncScpi``) that a raw
+    command changes on Red Pitaya, so it is asked again on the next read.
+
+    The setter methods send their command first and cache the new value afterwards, so
+    they are not affected.
+    """
+    if not msg[:4].upper() == "ACQ:" or msg.endswith("?"):
+        return
+    cmd = msg.upper()
+    if cmd.startswith("ACQ:RST"):
+        client.invalidate_cache()
+    elif cmd.startswith("ACQ:DATA:UNITS"):
+        client._units = None
+        client._fast_mode = False
+    elif cmd.startswith("ACQ:DATA:FORMAT"):
+        client._data_format = None
+        client._fast_mode = False
+    elif cmd.startswith("ACQ:SOUR") and ":GAIN" in cmd:
+        client._gain.pop(int(cmd[8]), None)
+    elif cmd.startswith("ACQ:DEC"):
+        client._decimation = None
+    elif cmd.startswith("ACQ:TRIG:DLY"):
+        client._trig_delay = None
+
 class scpi (object):
     """SCPI class used to access Red Pitaya over an IP network."""
     delimiter = '\r\n'
+    sample_rate = 125e6         # ADC sample rate (S/s) before decimation
+    buffer_size = 16384         # Acquisition buffer length in samples
 
 
     ####################################################
@@ -153,6 +372,17 @@ class scpi (object):
         self.host    = host
         self.port    = port
         self.timeout = timeout
+        self._rx_buf = bytearray()      # Bytes received but not consumed yet
+        self._tx_buf = None             # Commands waiting to be sent (inside pipeline())
+
+        # Acquisition state set through this object (None/missing = ask Red Pitaya)
+        self.invalidate_cache()
+
+        # Error checking (see set_error_policy)
+        self.error_policy = ErrorPolicy.IMMEDIATE
+        self.error_check_every = 0
+        self._unchecked = 0             # Commands sent since the last error check
+        self._batch_depth = 0
 
         try:
             self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -161,6 +391,7 @@ class scpi (object):
                 self._socket.settimeout(timeout)
 
             self._socket.connect((host, port))
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)     # Don't delay small queries
 
         except socket.error as e:
             print('SCPI >> connect({!s:s}:{:d}) failed: {!s:s}'.format(host, port, e))
@@ -174,49 +405,92 @@ class scpi (object):
         """Close IP connection."""
         self.__del__()
 
-    def rx_txt(self, chunksize: int = 4096):
-        """Receive text string and return it after removing the delimiter."""
-        msg = ''
+    def rx_line(self, chunksize: int = 65536) -> bytes:
+        """Receive one reply as raw bytes and return it without the delimiter.
+
+        Received bytes are collected in the receive buffer and only the newly received part is
+        searched for the delimiter. Bytes after the delimiter stay in the buffer for the next
+        reply, so several queries can be sent before reading their replies.
+        """
+        delimiter = self.delimiter.encode('utf-8')
+        start = 0
         while 1:
-            chunk = self._socket.recv(chunksize).decode('utf-8')        # Receive chunk size of 2^n preferably
-            msg += chunk
-            if (len(msg) >= 2 and msg[-2:] == self.delimiter):
-                return msg[:-2]
+            end = self._rx_buf.find(delimiter, start)
+            if end >= 0:
+                line = bytes(self._rx_buf[:end])
+                del self._rx_buf[:end + len(delimiter)]
+                return line
+            start = max(len(self._rx_buf) - len(delimiter) + 1, 0)
+            self._rx_fill(chunksize)
+
+    def rx_txt(self, chunksize: int = 65536):
+        """Receive text string and return it after removing the delimiter."""
+        return self.rx_line(chunksize).decode('utf-8')
 
-    def rx_txt_check_error(self, chunksize: int = 4096, stop: bool = True):
+    def rx_txt_check_error(self, chunksize: int = 65536, stop: bool = True):
         """Receive text string and return it after removing the delimiter.
         Check for error."""
         msg = self.rx_txt(chunksize)
         self.check_error(stop)
         return msg
 
-    def rx_arb(self):
-        """ Recieve binary data from scpi server"""
-        numOfBytes = 0
-        data=b''
-        while len(data) != 1:
-            data = self._socket.recv(1)
-        if data != b'#':
+    def _rx_fill(self, chunksize: int = 4096) -> None:
+        """Append the next chunk received from the socket to the receive buffer."""
+        self.flush()
+        chunk = self._socket.recv(chunksize)
+        if not chunk:
+            raise ConnectionError(f"SCPI >> connection to {self.host}:{self.port} closed")
+        self._rx_buf += chunk
+
+    def _rx_exact(self, size: int) -> bytes:
+        """Return exactly `size` bytes, reading ahead into the receive buffer."""
+        while len(self._rx_buf) < size:
+            self._rx_fill()
+        data = bytes(self._rx_buf[:size])
+        del self._rx_buf[:size]
+        return data
+
+    def _rx_into(self, view: memoryview) -> None:
+        """Fill `view` completely, first from the receive buffer and then straight from the socket."""
+        pending = min(len(self._rx_buf), len(view))
+        view[:pending] = self._rx_buf[:pending]
+        del self._rx_buf[:pending]
+
+        if pending < len(view):
+            self.flush()
+        while pending < len(view):
+            r_size = self._socket.recv_into(view[pending:])
+            if r_size == 0:
+                raise ConnectionError(f"SCPI >> connection to {self.host}:{self.port} closed")
+            pending += r_size
+
+    def rx_arb(self, out: Optional[Union[bytearray, np.ndarray]] = None):
+        """ Recieve binary data from scpi server.
+
+        The IEEE-488 block header (``#<N><len>``) is parsed from the receive buffer and
+        the payload is received with ``recv_into`` into a preallocated buffer, so no
+        intermediate copies are made. If `out` is given, the payload is written into it
+        and a memoryview of the filled bytes is returned, otherwise a new ``bytearray``
+        is returned. Both can be wrapped with ``np.frombuffer`` without copying.
+        """
+        if self._rx_exact(1) != b'#':
             return False
-        data=b''
 
-        while len(data) != 1:
-            data = self._socket.recv(1)
-        numOfNumBytes = int(data)
+        numOfNumBytes = int(self._rx_exact(1))
         if numOfNumBytes <= 0:
             return False
-        data=b''
+        numOfBytes = int(self._rx_exact(numOfNumBytes))
 
-        while len(data) != numOfNumBytes:
-            data += (self._socket.recv(1))
-        numOfBytes = int(data)
-        data=b''
-
-        while len(data) < numOfBytes:
-            r_size = min(numOfBytes - len(data),4096)
-            data += (self._socket.recv(r_size))
+        if out is None:
+            data = bytearray(numOfBytes)
+            self._rx_into(memoryview(data))
+        else:
+            data = memoryview(out).cast('B')
+            assert len(data) >= numOfBytes, f"Output buffer too small ({len(data)} < {numOfBytes} bytes)"
+            data = data[:numOfBytes]
+            self._rx_into(data)
 
-        self._socket.recv(2)        # recive \r\n
+        self._rx_exact(2)           # recive \r\n
 
         return data
 
@@ -228,8 +502,56 @@ class scpi (object):
 
     def tx_txt(self, msg: str):
         """Send text string ending and append delimiter."""
+        self._unchecked += 1
+        _track_acq_command(self, msg)
+        if self._tx_buf is not None:
+            self._tx_buf.append(msg + self.delimiter)
+            return None
         return self._socket.sendall((msg + self.delimiter).encode('utf-8'))     # was send(().encode('utf-8'))
 
+    def tx_txt_multi(self, msgs: List[str]):
+        """Send several text strings in a single write, appending the delimiter to each."""
+        self._unchecked += len(msgs)
+        for msg in msgs:
+            _track_acq_command(self, msg)
+        if self._tx_buf is not None:
+            self._tx_buf.extend(msg + self.delimiter for msg in msgs)
+            return None
+        return self._socket.sendall(''.join(msg + self.delimiter for msg in msgs).encode('utf-8'))
+
+    def flush(self):
+        """Send the commands buffered by pipeline() in a single write."""
+        if self._tx_buf:
+            msg = ''.join(self._tx_buf)
+            self._tx_buf.clear()
+            self._socket.sendall(msg.encode('utf-8'))
+
+    @contextmanager
+    def pipeline(self):
+        """
+        Context manager that buffers outgoing commands and sends them in one write at the
+        end of the block (or as soon as a reply has to be read)::
+
+            with rp.pipeline():
+                rp.tx_txt('ACQ:RST')
+                rp.tx_txt('ACQ:DEC 1')
+                rp.tx_txt('ACQ:TRIG:LEV 0')
+
+        Errors are checked once at the end of the block, like in ``batch()``.
+        """
+        with self.batch():
+            outer = self._tx_buf is not None
+            if not outer:
+                self._tx_buf = []
+            try:
+                yield self
+            finally:
+                if not outer:
+                    try:
+                        self.flush()
+                    finally:
+                        self._tx_buf = None
+
     def tx_txt_check_error(self, msg: str, stop: bool= True):
         """Send text string ending and append delimiter. Check for error."""
         self.tx_txt(msg)
@@ -240,18 +562,76 @@ class scpi (object):
         self.tx_txt(msg)
         return self.rx_txt()
 
-    def check_error(self, stop = True):
-        """Read error from Red Pitaya and print it."""
+    def check_error(self, stop: bool = True, force: bool = False) -> List[str]:
+        """Read errors from Red Pitaya according to the error policy.
+
+        Returns the list of errors read. If `stop` is True and any error was read, a
+        ``ScpiError`` is raised instead. With `force` the errors are read regardless
+        of the policy.
+        """
+        if not force:
+            if self.error_policy == ErrorPolicy.OFF:
+                return []
+            if self.error_policy == ErrorPolicy.BATCHED:
+                if self.error_check_every <= 0 or self._unchecked < self.error_check_every:
+                    return []
+
+        errors = []
         res = int(self.stb_q())
         if (res & 0x4):
             while 1:
                 err = self.err_n()
                 if (err.startswith('0,')):
                     break
-                print(err)
-                n = err.split(",")
-                if (len(n) > 0 and stop and int(n[0]) > 9500):
-                    exit(1)
+                errors.append(err)
+        self._unchecked = 0
+
+        if errors and stop:
+            raise ScpiError(errors)
+        return errors
+
+    def set_error_policy(self, policy: ErrorPolicy, every: int = 0) -> None:
+        """
+        Set when the errors of the SCPI server are checked.
+
+            IMMEDIATE - after every function call (default)
+            BATCHED   - once every `every` commands (0 = never) and at the end of a ``batch()`` block
+            OFF       - never, for hot loops (``check_error(force=True)`` still checks)
+
+        Args:
+            policy (ErrorPolicy): Error checking policy.
+            every (int, optional): Number of commands between checks in BATCHED mode. Defaults to 0.
+        """
+        assert every >= 0, "Number of commands between error checks cannot be negative"
+        self.error_policy = policy
+        self.error_check_every = every
+
+    @contextmanager
+    def batch(self):
+        """
+        Context manager that checks errors once at the end of the block instead of after
+        every command::
+
+            with rp.batch():
+                rp.gen_set(1, freq=10000)
+                rp.acq_set(dec=16)
+
+        Raises ``ScpiError`` on exit if any command in the block failed. With the OFF
+        policy nothing is checked.
+        """
+        previous = (self.error_policy, self.error_check_every)
+        if self.error_policy == ErrorPolicy.IMMEDIATE:
+            self.error_policy = ErrorPolicy.BATCHED
+            self.error_check_every = 0
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            self.error_policy, self.error_check_every = previous
+
+        if self._batch_depth == 0 and self.error_policy != ErrorPolicy.OFF and self._unchecked > 0:
+            self.check_error(force=True)
 
 
     ###########################################
@@ -365,17 +745,18 @@ class scpi (object):
         if trig_mode is not None and trig_mode.upper() not in trig_mode_list:
             raise ValueError(f"{trig_mode.upper()} is not a defined trigger source")
     
-        if x_channel:
-            # Set up X-channel daisy chain
-            self.tx_txt("DAISY:SYNC:CLK ON")
-            self.tx_txt("DAISY:SYNC:TRIG ON")
-
-        elif click_shield:
-            # Set up Click Shield daisy chain
-            self.tx_txt("DAISY:TRig:Out:ENable ON")
-            if trig_mode is not None:
-                self.tx_txt(f"DAISY:TRig:Out:SOUR {trig_mode.upper()}")
-        self.check_error()
+        with self.pipeline():
+            if x_channel:
+                # Set up X-channel daisy chain
+                self.tx_txt("DAISY:SYNC:CLK ON")
+                self.tx_txt("DAISY:SYNC:TRIG ON")
+
+            elif click_shield:
+                # Set up Click Shield daisy chain
+                self.tx_txt("DAISY:TRig:Out:ENable ON")
+                if trig_mode is not None:
+                    self.tx_txt(f"DAISY:TRig:Out:SOUR {trig_mode.upper()}")
+            self.check_error()
 
     def daisy_get_settings(
         self
@@ -551,34 +932,35 @@ class scpi (object):
         """
         self._validate_gen_set_params(chan, func, volt, freq, offset, phase, dcyc, data, trig_sour, ext_trig_deb_us, ext_trig_lev, load, sdrlab, siglab)
 
-        # Load needs to be set before the amplitude
-        if siglab:
-            if ext_trig_lev is not None:
-                self.tx_txt(f"TRig:EXT:LEV {ext_trig_lev}")
-            if load is not None:
-                self.tx_txt(f"SOUR{chan}:LOAD {load.value}")
-
-        self.tx_txt(f"SOUR{chan}:FUNC {func.value}")
-        self.tx_txt(f"SOUR{chan}:VOLT {volt}")
-
-        if func not in {Waveform.DC, Waveform.DC_NEG}:
-            self.tx_txt(f"SOUR{chan}:FREQ:FIX {freq}")
+        with self.pipeline():
+            # Load needs to be set before the amplitude
+            if siglab:
+                if ext_trig_lev is not None:
+                    self.tx_txt(f"TRig:EXT:LEV {ext_trig_lev}")
+                if load is not None:
+                    self.tx_txt(f"SOUR{chan}:LOAD {load.value}")
+
+            self.tx_txt(f"SOUR{chan}:FUNC {func.value}")
+            self.tx_txt(f"SOUR{chan}:VOLT {volt}")
+
+            if func not in {Waveform.DC, Waveform.DC_NEG}:
+                self.tx_txt(f"SOUR{chan}:FREQ:FIX {freq}")
+
+            if offset is not None:
+                self.tx_txt(f"SOUR{chan}:VOLT:OFFS {offset}")
+            if phase is not None:
+                self.tx_txt(f"SOUR{chan}:PHAS {phase}")
+            if func == Waveform.PWM and dcyc is not None:
+                self.tx_txt(f"SOUR{chan}:DCYC {dcyc}")
+            if data is not None and func == Waveform.ARBITRARY:
+                cust_wf = ",".join(map(str, data))
+                self.tx_txt(f"SOUR{chan}:TRAC:DATA:DATA {cust_wf}")
+            if trig_sour is not None:
+                self.tx_txt(f"SOUR{chan}:TRig:SOUR {trig_sour.value}")
+            if ext_trig_deb_us is not None:
+                self.tx_txt(f"SOUR:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
 
-        if offset is not None:
-            self.tx_txt(f"SOUR{chan}:VOLT:OFFS {offset}")
-        if phase is not None:
-            self.tx_txt(f"SOUR{chan}:PHAS {phase}")
-        if func == Waveform.PWM and dcyc is not None:
-            self.tx_txt(f"SOUR{chan}:DCYC {dcyc}")
-        if data is not None and func == Waveform.ARBITRARY:
-            cust_wf = ",".join(map(str, data))
-            self.tx_txt(f"SOUR{chan}:TRAC:DATA:DATA {cust_wf}")
-        if trig_sour is not None:
-            self.tx_txt(f"SOUR{chan}:TRig:SOUR {trig_sour.value}")
-        if ext_trig_deb_us is not None:
-            self.tx_txt(f"SOUR:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
-
-        self.check_error()
+            self.check_error()
 
     def gen_get_settings(self, chan: int, siglab: bool = False) -> List[str | None]:
         """
@@ -704,17 +1086,18 @@ class scpi (object):
         """
         self._validate_burst_params(chan, ncyc, nor, period, init_val, last_val, siglab)
 
-        self.tx_txt(f"SOUR{chan}:BURS:STAT BURST")
-        self.tx_txt(f"SOUR{chan}:BURS:NCYC {ncyc}")
-        self.tx_txt(f"SOUR{chan}:BURS:NOR {nor}")
+        with self.pipeline():
+            self.tx_txt(f"SOUR{chan}:BURS:STAT BURST")
+            self.tx_txt(f"SOUR{chan}:BURS:NCYC {ncyc}")
+            self.tx_txt(f"SOUR{chan}:BURS:NOR {nor}")
 
-        if period is not None:
-            self.tx_txt(f"SOUR{chan}:BURS:INT:PER {period}")
+            if period is not None:
+                self.tx_txt(f"SOUR{chan}:BURS:INT:PER {period}")
 
-        self.tx_txt(f"SOUR{chan}:BURS:LASTValue {last_val}")
-        self.tx_txt(f"SOUR{chan}:INITValue {init_val}")
+            self.tx_txt(f"SOUR{chan}:BURS:LASTValue {last_val}")
+            self.tx_txt(f"SOUR{chan}:INITValue {init_val}")
 
-        self.check_error()
+            self.check_error()
 
     def gen_get_burst_settings(self, chan: int) -> List[str | None]:
         """
@@ -798,14 +1181,15 @@ class scpi (object):
 
         self._validate_sweep_params(chan, start_freq, stop_freq, time_us, mode, direction, sdrlab)
 
-        self.tx_txt(f"SOUR{chan}:SWeep:STATE ON")
-        self.tx_txt(f"SOUR{chan}:SWeep:FREQ:START {start_freq}")
-        self.tx_txt(f"SOUR{chan}:SWeep:FREQ:STOP {stop_freq}")
-        self.tx_txt(f"SOUR{chan}:SWeep:TIME {time_us}")
-        self.tx_txt(f"SOUR{chan}:SWeep:MODE {mode.value}")
-        self.tx_txt(f"SOUR{chan}:SWeep:DIR {direction.value}")
+        with self.pipeline():
+            self.tx_txt(f"SOUR{chan}:SWeep:STATE ON")
+            self.tx_txt(f"SOUR{chan}:SWeep:FREQ:START {start_freq}")
+            self.tx_txt(f"SOUR{chan}:SWeep:FREQ:STOP {stop_freq}")
+            self.tx_txt(f"SOUR{chan}:SWeep:TIME {time_us}")
+            self.tx_txt(f"SOUR{chan}:SWeep:MODE {mode.value}")
+            self.tx_txt(f"SOUR{chan}:SWeep:DIR {direction.value}")
 
-        self.check_error()
+            self.check_error()
 
     def gen_get_sweep_settings(self, chan: int) -> List[str | None]:
         """
@@ -1048,21 +1432,26 @@ class scpi (object):
 
         #!!!!! n = 4 if input4 else 2
 
-        self.tx_txt(f"ACQ:DEC:Factor {dec}")
-        self.tx_txt(f"ACQ:AVG {'ON' if averaging else 'OFF'}")
-        if units is not None:
-            self.tx_txt(f"ACQ:DATA:Units {units.value}")
-        if data_format is not None:
-            self.tx_txt(f"ACQ:DATA:FORMAT {data_format.value}")
+        with self.pipeline():
+            self.tx_txt(f"ACQ:DEC:Factor {dec}")
+            self._decimation = dec
+            self.tx_txt(f"ACQ:AVG {'ON' if averaging else 'OFF'}")
+            if units is not None:
+                self.tx_txt(f"ACQ:DATA:Units {units.value}")
+                self._units = units.value
+            if data_format is not None:
+                self.tx_txt(f"ACQ:DATA:FORMAT {data_format.value}")
+                self._data_format = data_format.value
+
+            if gain is not None:
+                for i, g in enumerate(gain, start=1):
+                    self.tx_txt(f"ACQ:SOUR{i}:GAIN {g.value}")
+                    self._gain[i] = g
+            if coupling is not None and siglab:
+                for i, c in enumerate(coupling, start=1):
+                    self.tx_txt(f"ACQ:SOUR{i}:COUP {c.value}")
 
-        if gain is not None:
-            for i, g in enumerate(gain, start=1):
-                self.tx_txt(f"ACQ:SOUR{i}:GAIN {g.value}")
-        if coupling is not None and siglab:
-            for i, c in enumerate(coupling, start=1):
-                self.tx_txt(f"ACQ:SOUR{i}:COUP {c.value}")
-
-        self.check_error()
+            self.check_error()
 
     def acq_get_settings(self, siglab: bool = False, input4: bool = False) -> List[str | None]:
         """
@@ -1142,6 +1531,70 @@ class scpi (object):
         self.tx_txt("ACQ:STOP")
         self.check_error()
 
+    def wait_triggered(self, timeout: Optional[float] = 0.5, fill: bool = True) -> tuple:
+        """
+        Waits for the acquisition trigger and, optionally, for the buffer to fill.
+
+        ``ACQ:TRig:STAT?`` and ``ACQ:TRig:FILL?`` are polled with a growing interval instead
+        of back to back. The first interval is a fraction of the time needed to fill the
+        buffer at the current decimation; it doubles on every unsuccessful poll, up to the
+        full buffer time (at least 5 ms).
+
+        Parameters
+        ----------
+            timeout (float, optional):
+                Maximum time to wait in seconds. None waits forever.
+                Defaults to 0.5.
+            fill (bool, optional):
+                Also wait until the buffer is full after the trigger.
+                Defaults to True.
+
+        Returns
+        -------
+            (bool, float):
+                True if the trigger occurred (and the buffer filled, if `fill` is set)
+                before the timeout, and the time waited in seconds.
+        """
+        start = time.perf_counter()
+        deadline = None if timeout is None else start + timeout
+        buffer_time = self.buffer_size * self._acq_decimation() / self.sample_rate
+        min_interval = max(buffer_time / 8, 1e-4)
+        max_interval = max(buffer_time, 5e-3)
+
+        def poll(query: str, expected: str) -> bool:
+            interval = min_interval
+            while self.txrx_txt(query) != expected:
+                now = time.perf_counter()
+                if deadline is not None and now >= deadline:
+                    return False
+                time.sleep(interval if deadline is None else min(interval, deadline - now))
+                interval = min(interval * 2, max_interval)
+            return True
+
+        done = poll("ACQ:TRig:STAT?", "TD")
+        if done and fill:
+            done = poll("ACQ:TRig:FILL?", "1")
+
+        return done, time.perf_counter() - start
+
+    def _acq_decimation(self) -> int:
+        """
+        Returns the acquisition decimation, asking Red Pitaya only if it was not set through this object.
+        """
+        if self._decimation is None:
+            self._decimation = int(self.txrx_txt("ACQ:DEC?"))
+        return self._decimation
+
+    def _acq_metadata(self, gain: Optional[Union[Gain, tuple]]) -> dict:
+        """
+        Returns the acquisition settings attached to acquired data (see ``AcqData``).
+        Settings not made through this object are asked from Red Pitaya once.
+        """
+        dec = self._acq_decimation()
+        if self._trig_delay is None:
+            self._trig_delay = int(self.txrx_txt("ACQ:TRig:DLY?"))
+        return dict(sample_rate=self.sample_rate / dec, decimation=dec, gain=gain, trig_delay=self._trig_delay)
+
     # Acq trigger
     def acq_trig_set(
         self,
@@ -1194,23 +1647,26 @@ class scpi (object):
         """
         self._validate_acq_trig_params(trig_lvl, trig_delay, trig_hyst, ext_trig_deb_us, ext_trig_lvl, siglab, input4)
 
-        if trig_delay_ns:
-            self.tx_txt(f"ACQ:TRig:DLY:NS {trig_delay}")
-        else:
-            self.tx_txt(f"ACQ:TRig:DLY {trig_delay}")
+        with self.pipeline():
+            if trig_delay_ns:
+                self.tx_txt(f"ACQ:TRig:DLY:NS {trig_delay}")
+                self._trig_delay = None
+            else:
+                self.tx_txt(f"ACQ:TRig:DLY {trig_delay}")
+                self._trig_delay = trig_delay
 
-        if trig_hyst is not None:
-            self.tx_txt(f"ACQ:TRig:HYST {trig_hyst}")
+            if trig_hyst is not None:
+                self.tx_txt(f"ACQ:TRig:HYST {trig_hyst}")
 
-        if ext_trig_deb_us is not None:
-            self.tx_txt(f"ACQ:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
+            if ext_trig_deb_us is not None:
+                self.tx_txt(f"ACQ:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
 
-        self.tx_txt(f"ACQ:TRig:LEV {trig_lvl}")
+            self.tx_txt(f"ACQ:TRig:LEV {trig_lvl}")
 
-        if siglab and ext_trig_lvl is not None:
-            self.tx_txt(f"TRig:EXT:LEV {ext_trig_lvl}")
+            if siglab and ext_trig_lvl is not None:
+                self.tx_txt(f"TRig:EXT:LEV {ext_trig_lvl}")
 
-        self.check_error()
+            self.check_error()
 
     def acq_get_trig_settings(self, siglab: bool = False) -> List[str | None]:
         """
@@ -1293,15 +1749,16 @@ class scpi (object):
         """
         self._validate_acq_trig_ext_hyst_params(trig_hyst, ext_trig_deb_us, ext_trig_lvl, siglab)
 
-        if trig_hyst is not None:
-            self.tx_txt(f"ACQ:TRig:HYST {trig_hyst}")
+        with self.pipeline():
+            if trig_hyst is not None:
+                self.tx_txt(f"ACQ:TRig:HYST {trig_hyst}")
 
-        if ext_trig_deb_us is not None:
-            self.tx_txt(f"ACQ:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
+            if ext_trig_deb_us is not None:
+                self.tx_txt(f"ACQ:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
 
-        if siglab and ext_trig_lvl is not None:
-            self.tx_txt(f"TRig:EXT:LEV {ext_trig_lvl}")
-        self.check_error()
+            if siglab and ext_trig_lvl is not None:
+                self.tx_txt(f"TRig:EXT:LEV {ext_trig_lvl}")
+            self.check_error()
 
     # Misc
     def acq_set_units_format(
@@ -1325,11 +1782,57 @@ class scpi (object):
         self._validate_units_format(units, data_format)
         if units is not None:
             self.tx_txt(f"ACQ:DATA:Units {units.value}")
+            self._units = units.value
         if data_format is not None:
             self.tx_txt(f"ACQ:DATA:FORMAT {data_format.value}")
+            self._data_format = data_format.value
 
         self.check_error()
 
+    def invalidate_cache(self) -> None:
+        """
+        Forgets the acquisition settings remembered on the client (units, format, gains,
+        fast mode, decimation and trigger delay). They are asked from Red Pitaya again
+        the next time they are needed.
+
+        Called automatically when ``ACQ:RST`` is sent; call it after changing the
+        acquisition settings by other means (another client, the web interface).
+        """
+        self._units = None
+        self._data_format = None
+        self._gain = {}
+        self._fast_mode = False
+        self._decimation = None
+        self._trig_delay = None
+
+    def acq_reset(self) -> None:
+        """
+        Resets the acquisition to its default settings (``ACQ:RST``) and forgets the cached ones.
+        """
+        self.tx_txt("ACQ:RST")
+
+    def acq_set_fast_mode(self, enable: bool = True) -> None:
+        """
+        Enables or disables the fast acquisition mode.
+
+        In fast mode the data is transferred as binary RAW samples (int16, 4x smaller than
+        ASCII Volts) and converted to Volts on the host using the gain of each channel.
+        Format, units and gains are remembered on the client, so reading a channel costs
+        a single query and one binary block. Disabling returns to ASCII Volts.
+
+        Parameters
+        -----------
+
+            enable (bool, optional) :
+                Enable/disable the fast acquisition mode.
+                Defaults to True.
+        """
+        if enable:
+            self.acq_set_units_format(Units.RAW, DataFormat.BIN)
+        else:
+            self.acq_set_units_format(Units.VOLTS, DataFormat.ASCII)
+        self._fast_mode = enable
+
     # Split trigger mode
     def acq_split_enable(self) -> None:
         """
@@ -1397,14 +1900,16 @@ class scpi (object):
         """
         self._validate_acq_split_params(chan, dec, gain, coupling, siglab, input4)
 
-        self.tx_txt(f"ACQ:DEC:Factor:CH{chan} {dec}")
-        self.tx_txt(f"ACQ:AVG:CH{chan} {'ON' if averaging else 'OFF'}")
-        if gain is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:GAIN {gain.value}")
-        if siglab and coupling is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:COUP {coupling.value}")
+        with self.pipeline():
+            self.tx_txt(f"ACQ:DEC:Factor:CH{chan} {dec}")
+            self.tx_txt(f"ACQ:AVG:CH{chan} {'ON' if averaging else 'OFF'}")
+            if gain is not None:
+                self.tx_txt(f"ACQ:SOUR{chan}:GAIN {gain.value}")
+                self._gain[chan] = gain
+            if siglab and coupling is not None:
+                self.tx_txt(f"ACQ:SOUR{chan}:COUP {coupling.value}")
 
-        self.check_error()
+            self.check_error()
 
     def acq_split_trig_set(
         self,
@@ -1504,11 +2009,24 @@ class scpi (object):
 
         Returns
         -------
-            np.ndarray:
-                Numpy array with captured data.
+            AcqData:
+                Numpy array with captured data and the acquisition settings (sample rate, decimation, gain, trigger delay).
         """
         self._validate_acq_data_params(chan, start, end, num_samples, old, last, trig_pos, input4)
 
+        # Get data type from Red Pitaya unless it was set through this object
+        # (replies arrive in order, so ask before the data query)
+        cached = self._units is not None and self._data_format is not None
+        if cached:
+            units = self._units
+            data_format = self._data_format
+        else:
+            units = self.txrx_txt('ACQ:DATA:Units?')
+            data_format = self.txrx_txt("ACQ:DATA:FORMAT?")
+            self.check_error()
+        gain = self._channel_gain(chan) if self._fast_mode else None
+        metadata = self._acq_metadata(gain or self._gain.get(chan))
+
         # Determine the output data
         if start is not None and end is not None:
             self.tx_txt(f"ACQ:SOUR{chan}:DATA:STArt:End? {start},{end}")
@@ -1523,27 +2041,126 @@ class scpi (object):
         else:
             self.tx_txt(f"ACQ:SOUR{chan}:DATA?")
 
-        # Get data type from Red Pitaya
-        units = self.txrx_txt('ACQ:DATA:Units?')
-        data_format = self.txrx_txt("ACQ:DATA:FORMAT?")
-        self.check_error()
+        buff = AcqData(self._rx_acq_data(units, data_format, gain), **metadata)
+        if not cached:
+            self.check_error()
 
-        #! Check if data_format is correct
-        # Convert data
-        if data_format == "BIN":
-            buff_byte = self.rx_arb()
-            if units == "VOLTS":
-                buff = np.frombuffer(buff_byte, dtype='>f4')
-                #buff = [struct.unpack('!f',bytearray(buff_byte[i:i+4]))[0] for i in range(0, len(buff_byte), 4)]
-            elif units == "RAW":
-                buff = np.frombuffer(buff_byte, dtype='>i2')
-                #buff = [struct.unpack('!h',bytearray(buff_byte[i:i+2]))[0] for i in range(0, len(buff_byte), 2)]
+        return buff
+
+    def acq_data_multi(
+        self,
+        channels: Sequence[int] = (1, 2, 3, 4),
+        out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Returns the whole buffer of several channels in one round trip.
+
+        All ``ACQ:SOURx:DATA?`` queries are sent in a single write and the replies are
+        read back in order into one (channels, samples) array.
+
+        Parameters
+        ----------
+            channels (list(int), optional):
+                Input acquisition channels, in the order of the returned rows.
+                Defaults to (1, 2, 3, 4).
+            out (ndarray, optional):
+                Preallocated (len(channels), samples) array to fill. Pass the array returned
+                by the previous call to avoid allocating a new one every frame.
+                Defaults to None.
+
+        Returns
+        -------
+            AcqData:
+                Numpy array with captured data, one row per channel, and the acquisition settings.
+        """
+        for chan in channels:
+            assert chan in (1, 2, 3, 4), f"Channel {chan} out of range"
+        if out is not None:
+            assert out.ndim == 2 and out.shape[0] == len(channels), "Output array must have one row per channel"
+
+        cached = self._units is not None and self._data_format is not None
+        if cached:
+            units = self._units
+            data_format = self._data_format
         else:
-            buff_string = self.rx_txt().strip('{}\n\r').replace("  ", "").split(',')
-            buff = np.array(buff_string).astype(np.float64)
-        self.check_error()
+            units = self.txrx_txt('ACQ:DATA:Units?')
+            data_format = self.txrx_txt("ACQ:DATA:FORMAT?")
+            self.check_error()
+        gains = [self._channel_gain(chan) if self._fast_mode else None for chan in channels]
+        metadata = self._acq_metadata(tuple(gain or self._gain.get(chan) for gain, chan in zip(gains, channels)))
+
+        self.tx_txt_multi([f"ACQ:SOUR{chan}:DATA?" for chan in channels])
+
+        for i, gain in enumerate(gains):
+            if out is None:
+                row = self._rx_acq_data(units, data_format, gain)
+                out = np.empty((len(channels), len(row)), dtype=row.dtype.newbyteorder('='))
+                out[i] = row
+            else:
+                self._rx_acq_data(units, data_format, gain, out=out[i])
+        if not cached:
+            self.check_error()
 
-        return buff
+        return AcqData(out, **metadata)
+
+    def acq_stream(
+        self,
+        channels: Sequence[int] = (1,),
+        dec: Optional[int] = None,
+        block_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        max_overruns: Optional[int] = 10,
+        timeout: Optional[float] = None
+    ) -> "AcqStream":
+        """
+        Returns a continuous acquisition stream, longer than one buffer (see ``AcqStream``).
+
+        Parameters
+        ----------
+            channels (list(int), optional):
+                Input acquisition channels. Defaults to (1,).
+            dec (int, optional):
+                Decimation to set before streaming. Defaults to None (current one).
+            block_size (int, optional):
+                Length of the yielded gapless blocks. Defaults to None (every read).
+            poll_interval (float, optional):
+                Time between write pointer polls in seconds. Defaults to None (a quarter of the buffer time).
+            max_overruns (int, optional):
+                Consecutive overruns before ``StreamOverrunError`` is raised. Defaults to 10.
+            timeout (float, optional):
+                Time without new samples before ``TimeoutError`` is raised. Defaults to None
+                (two buffer times, at least 1 s).
+
+        Returns
+        -------
+            AcqStream:
+                Iterable of (index, AcqData) tuples.
+        """
+        return AcqStream(self, channels, dec, block_size, poll_interval,
+                         max_overruns=max_overruns, timeout=timeout)
+
+    def _channel_gain(self, chan: int) -> Gain:
+        """
+        Returns the input gain of a channel, asking Red Pitaya only the first time.
+        """
+        if chan not in self._gain:
+            self._gain[chan] = Gain(self.txrx_txt(f"ACQ:SOUR{chan}:GAIN?").upper())
+        return self._gain[chan]
+
+    def _rx_acq_data(
+        self,
+        units: str,
+        data_format: str,
+        gain: Optional[Gain] = None,
+        out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Receives one acquisition data reply and converts it to a numpy array.
+        RAW binary data is converted to Volts when `gain` is given.
+        If `out` is given, the samples are written into it.
+        """
+        payload = self.rx_arb() if data_format == "BIN" else self.rx_line()
+        return decode_acq_data(payload, units, data_format, gain, out)
 
     # Validations
     def _validate_acq_set_params(
@@ -1565,7 +2182,7 @@ class scpi (object):
         units_list = [e.value for e in Units]
         format_list = [e.value for e in DataFormat]
 
-        assert (dec not in dec_fact_list) and (16 <= dec <= 65536), "Decimation factor out of range [1,2,4,8,16,17,18,...,65536]"
+        assert (dec not in dec_fact_list) and (1 <= dec <= 65536), "Decimation factor out of range [1,2,4,8,16,17,18,...,65536]"
         if units is not None:
             assert units.value in units_list, f"{units.value} is not a defined unit"
         if data_format is not None:
@@ -1659,7 +2276,7 @@ class scpi (object):
         n = 4 if input4 else 2
 
         assert chan <= n, f"Channel {chan} out of range for the current Red Pitaya board"
-        assert (dec not in dec_fact_list) and (16 <= dec <= 65536), "Decimation factor out of range [1,2,4,8,16,17,18,...,65536]"
+        assert (dec not in dec_fact_list) and (1 <= dec <= 65536), "Decimation factor out of range [1,2,4,8,16,17,18,...,65536]"
         if gain is not None:
             assert gain.value in gain_list, f"{gain.value} is not a defined gain"
         if siglab and coupling is not None:
@@ -2015,21 +2632,22 @@ class scpi (object):
     
     def ler_canal(self, canal):
         
-        #leitura dos canais um a um
+        #leitura dos canais um a um (ASCII em Volts, a menos que outro formato tenha sido configurado)
+        gain = self._channel_gain(canal) if self._fast_mode else None
+        metadata = self._acq_metadata(gain or self._gain.get(canal))
         self.tx_txt(f'ACQ:SOUR{canal}:DATA?')
-        raw = self.rx_txt()
-        raw = raw.strip('{}\n\r').replace("  ", "").split(',')
-        return np.array(list(map(float, raw)))
+        return AcqData(self._rx_acq_data(self._units or "VOLTS", self._data_format or "ASCII", gain), **metadata)
 
     def __configure__(self):
 
-        # Configuração inicial do Red Pitaya
-        self.tx_txt('ACQ:RST')
+        # Configuração inicial do Red Pitaya (dados binários RAW, convertidos para Volts no computador)
+        self.acq_reset()    # Também esquece o estado guardado no cliente (ganhos, formato, decimação)
         self.tx_txt('ACQ:DEC 1')
-        self.tx_txt('ACQ:DATA:FORMAT ASCII')
-        self.tx_txt('ACQ:DATA:UNITS VOLTS')
+        self._decimation = 1
+        self.acq_set_fast_mode()
         self.tx_txt('ACQ:TRIG:LEV 0')
         self.tx_txt('ACQ:TRIG:DLY 0')
+        self._trig_delay = 0
     
     def set_attenuation(self, canal, att_db):
     #Configura a atenuação para um canal específico
@@ -2038,9 +2656,755 @@ class scpi (object):
         MAX_ATT = 20
         
         if att_db >= MIN_ATT and att_db <= MAX_ATT:
-            self.tx_txt(f'ACQ:SOUR{canal}:GAIN {"LV" if att_db == 0 else "HV"}')
+            gain = Gain.LV if att_db == 0 else Gain.HV
+            self.tx_txt(f'ACQ:SOUR{canal}:GAIN {gain.value}')
+            self._gain[canal] = gain
             atenuacao = att_db
             return True
         else:
             print(f"Atenuação {att_db}dB não suportada.")
-            return False
\ No newline at end of file
+            return False
+
+
+class BoardPool(object):
+    """
+    Several Red Pitaya boards connected in a daisy chain, used as one instrument.
+
+    The first host is the primary board; it generates the trigger that is shared with the
+    secondary boards. Commands and reads go to all boards concurrently (one thread per board),
+    so a frame from N boards takes about as long as a frame from one::
+
+        with BoardPool(['192.168.1.100', '192.168.1.101']) as pool:
+            pool.daisy_set()
+            pool.acq_set_fast_mode()
+            pool.arm('CH1_PE')
+            timestamp, frame = pool.acq_data_multi([1, 2])     # frame.shape == (2, 2, 16384)
+    """
+
+    def __init__(self, hosts: List[str], timeout: Optional[float] = None, port: int = 5000):
+        """Initialize object and open one IP connection per board."""
+        assert len(hosts) > 0, "At least one board is needed"
+        self._executor = ThreadPoolExecutor(max_workers=len(hosts))
+        self.boards = list(self._executor.map(lambda host: scpi(host, timeout, port), hosts))
+
+    def __len__(self) -> int:
+        return len(self.boards)
+
+    def __getitem__(self, index: int) -> scpi:
+        return self.boards[index]
+
+    def __iter__(self):
+        return iter(self.boards)
+
+    def __enter__(self) -> "BoardPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close all IP connections."""
+        for board in self.boards:
+            board.close()
+        self._executor.shutdown()
+
+    @property
+    def primary(self) -> scpi:
+        """Board that generates the shared trigger."""
+        return self.boards[0]
+
+    @property
+    def secondaries(self) -> List[scpi]:
+        """Boards triggered by the primary board."""
+        return self.boards[1:]
+
+    def map(self, func, items: Optional[list] = None) -> list:
+        """
+        Calls ``func(item)`` concurrently for each item (every board by default) and returns
+        the results in order. Exceptions raised in any call are raised here.
+        """
+        return list(self._executor.map(func, self.boards if items is None else items))
+
+    def daisy_set(self, x_channel: bool = True, click_shield: bool = False, trig_mode: Optional[str] = None) -> None:
+        """Configure the daisy chain on every board (see ``scpi.daisy_set``)."""
+        self.map(lambda board: board.daisy_set(x_channel, click_shield, trig_mode))
+
+    def acq_set_fast_mode(self, enable: bool = True) -> None:
+        """Enables or disables the fast acquisition mode on every board."""
+        self.map(lambda board: board.acq_set_fast_mode(enable))
+
+    def arm(self, trigger: str = "CH1_PE") -> None:
+        """
+        Starts the acquisition on all boards.
+
+        The secondary boards are armed first and wait for the shared trigger (EXT_NE);
+        the primary board is armed last with `trigger`, so no board misses the event.
+        """
+        def arm_board(board: scpi, source: str) -> None:
+            board.tx_txt_multi(["ACQ:START", f"ACQ:TRig {source}"])
+            board.check_error()
+
+        self.map(lambda board: arm_board(board, "EXT_NE"), self.secondaries)
+        arm_board(self.primary, trigger)
+
+    def acq_data_multi(
+        self,
+        channels: Sequence[int] = (1, 2, 3, 4),
+        out: Optional[np.ndarray] = None
+    ) -> tuple:
+        """
+        Reads the same channels from every board concurrently.
+
+        Parameters
+        ----------
+            channels (list(int), optional):
+                Input acquisition channels read from each board. Defaults to (1, 2, 3, 4).
+            out (ndarray, optional):
+                Preallocated (boards, len(channels), samples) array to fill, usually the
+                frame returned by the previous call. Defaults to None.
+
+        Returns
+        -------
+            (float, AcqData):
+                Host time (``time.time()``) when the read started, and the frame
+                with shape (boards, channels, samples).
+        """
+        if out is not None:
+            assert out.ndim == 3 and out.shape[:2] == (len(self.boards), len(channels)), \
+                "Output array must have shape (boards, channels, samples)"
+
+        timestamp = time.time()
+        if out is None:
+            frames = self.map(lambda board: board.acq_data_multi(channels))
+            out = np.stack(frames)
+        else:
+            frames = self.map(lambda i: self.boards[i].acq_data_multi(channels, out=out[i]), range(len(self.boards)))
+
+        # Settings of the primary board, with the gains of every board
+        metadata = dict(frames[0].metadata(), gain=tuple(frame.gain for frame in frames))
+        return timestamp, AcqData(out, **metadata)
+
+
+class Acquirer(object):
+    """
+    Runs the arm -> wait -> read cycle on a background thread.
+
+    Frames are read into a small pool of preallocated buffers and handed to the consumer
+    through a bounded queue. When the consumer falls behind, the oldest waiting frame is
+    dropped (and its buffer reused), so the newest data is always delivered and the next
+    capture is armed while the previous frame is still being processed::
+
+        with Acquirer(rp, [1, 2, 3, 4], trigger='CH1_PE') as acq:
+            while True:
+                index, timestamp, data = acq.get()      # data.shape == (4, 16384)
+                ...                                      # plot / process data
+
+    The buffer behind ``data`` goes back to the pool only when ``get()`` hands out a new
+    frame (or on ``release()``). A ``get()`` that returns None, e.g. a ``get(timeout=0)``
+    poll on every GUI tick, keeps the frame being drawn valid. Copy the data if it must
+    outlive the next frame. Commands sent to the board from other
+    threads while the acquirer runs must hold ``acq.lock``, so they are not interleaved
+    with the acquisition cycle.
+
+    `source` may be a ``scpi`` object or a ``BoardPool`` (frames are then (boards, channels, samples)).
+    """
+
+    def __init__(
+        self,
+        source: Union[scpi, BoardPool],
+        channels: Sequence[int] = (1, 2, 3, 4),
+        trigger: str = "CH1_PE",
+        timeout: Optional[float] = 0.5,
+        interval: float = 0.0,
+        queue_size: int = 1,
+        require_trigger: bool = False
+    ):
+        """
+        Parameters
+        ----------
+            source (scpi or BoardPool):
+                Connection used for acquisition.
+            channels (list(int), optional):
+                Channels read in every frame. Defaults to (1, 2, 3, 4).
+            trigger (str, optional):
+                Trigger source set when arming (see ``acq_trig_set``). Defaults to "CH1_PE".
+            timeout (float, optional):
+                Trigger timeout of each capture in seconds (see ``wait_triggered``).
+                Defaults to 0.5.
+            interval (float, optional):
+                Minimum time between the start of two captures in seconds. Defaults to 0.
+            queue_size (int, optional):
+                Completed frames kept waiting for the consumer. Defaults to 1.
+            require_trigger (bool, optional):
+                Discard captures that time out instead of reading them. Defaults to False.
+        """
+        assert queue_size >= 1, "Queue size must be at least 1"
+        self.source = source
+        self.channels = list(channels)
+        self.trigger = trigger
+        self.timeout = timeout
+        self.interval = interval
+        self.queue_size = queue_size
+        self.require_trigger = require_trigger
+
+        self.lock = threading.RLock()       # Held by the acquisition cycle
+        self.frames = 0                     # Frames captured
+        self.dropped = 0                    # Frames discarded before the consumer got them
+
+        # One buffer being filled, `queue_size` waiting and one held by the consumer
+        self._free = deque([None] * (queue_size + 2))
+        self._ready = deque()
+        self._held = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._error = None
+
+    def __enter__(self) -> "Acquirer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> "Acquirer":
+        """Starts the acquisition thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._error = None
+            self._thread = threading.Thread(target=self._run, name="Acquirer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stops the acquisition thread, after the capture in progress."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _capture(self, out: Optional[np.ndarray]) -> Optional[tuple]:
+        """One arm -> wait -> read cycle. Returns (timestamp, data), or None if the capture timed out."""
+        source = self.source
+        with self.lock:
+            if isinstance(source, BoardPool):
+                source.arm(self.trigger)
+                triggered = all(done for done, _ in source.map(lambda board: board.wait_triggered(self.timeout)))
+                if not triggered and self.require_trigger:
+                    return None
+                return source.acq_data_multi(self.channels, out=out)
+
+            source.tx_txt_multi(["ACQ:START", f"ACQ:TRig {self.trigger}"])
+            triggered, _ = source.wait_triggered(self.timeout)
+            if not triggered and self.require_trigger:
+                return None
+            timestamp = time.time()
+            return timestamp, source.acq_data_multi(self.channels, out=out)
+
+    def _run(self) -> None:
+        next_capture = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                delay = next_capture - time.perf_counter()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                next_capture = max(next_capture + self.interval, time.perf_counter())
+
+                with self._cond:
+                    buffer = self._free.popleft()
+
+                frame = self._capture(buffer)
+                if frame is None:
+                    with self._cond:
+                        self._free.append(buffer)
+                    continue
+
+                timestamp, data = frame
+                with self._cond:
+                    if len(self._ready) >= self.queue_size:
+                        _, _, old = self._ready.popleft()
+                        self._free.append(old)
+                        self.dropped += 1
+                    self._ready.append((self.frames, timestamp, data))
+                    self.frames += 1
+                    self._cond.notify()
+        except Exception as error:
+            self._error = error
+        finally:
+            with self._cond:
+                self._cond.notify_all()
+
+    def release(self) -> None:
+        """Returns the buffer of the last frame from ``get()`` to the pool."""
+        with self._cond:
+            if self._held is not None:
+                self._free.append(self._held)
+                self._held = None
+
+    def get(self, timeout: Optional[float] = None) -> Optional[tuple]:
+        """
+        Waits for the next completed frame.
+
+        The frame returned by the previous call is released only when a new frame is
+        returned; on timeout or stop it stays valid.
+
+        Parameters
+        ----------
+            timeout (float, optional):
+                Maximum time to wait in seconds. None waits forever. Defaults to None.
+
+        Returns
+        -------
+            (int, float, AcqData) or None:
+                Frame number (gaps mean dropped frames), host time when the frame was read
+                and the data; None on timeout or if the acquirer was stopped.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._ready or self._error is not None or not self.running, timeout)
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise error
+            if not self._ready:
+                return None
+            index, timestamp, data = self._ready.popleft()
+            if self._held is not None:
+                self._free.append(self._held)
+            self._held = data
+            return index, timestamp, data
+
+
+class AcqStream(object):
+    """
+    Continuous, gap-aware acquisition built on the circular acquisition buffer.
+
+    The acquisition is started without a trigger, so Red Pitaya keeps overwriting its
+    buffer. The write pointer (``ACQ:WPOS?``) is polled, and the samples written since
+    the previous poll are read with ``ACQ:SOURx:DATA:STArt:N?`` (the read wraps around
+    the end of the buffer). As long as each poll comes before the writer laps the
+    buffer, consecutive reads are contiguous::
+
+        for index, data in rp.acq_stream([1, 2], dec=1024, block_size=65536):
+            ...     # data.shape == (2, 65536); index counts samples from the start
+
+    Overruns are detected from the buffer pointers. The write pointer is queried again
+    right after every read, in the same round trip, and its advance is added to the
+    number of unread samples ahead of the read pointer. If the writer could have come
+    within ``margin`` of the read pointer (lapped it), the unread samples are discarded.
+    ``index`` then jumps by the number of samples lost, and the loss is counted in
+    ``overruns`` and ``lost_samples``.
+
+    A whole lap between two pointer readings is invisible in the pointers. It is caught
+    by a lower bound on the board time elapsed between them: the time from receiving the
+    previous reply to sending the next query. Both readings bracket that interval, so a
+    host stall inside it is time the board really kept writing, and a stall after a reply
+    arrived does not enter it. A write pointer that did not move at all is taken as a
+    stopped acquisition, not as a lap.
+
+    With ``block_size`` the contiguous reads are stitched into blocks of that length.
+    A gap ends the current block early, so every yielded block is gapless.
+
+    The stream never waits indefinitely. ``max_overruns`` consecutive overruns (without any
+    sample read in between), or only overruns for ``timeout`` seconds, raise
+    ``StreamOverrunError``. No new samples at all for ``timeout`` seconds (the acquisition
+    stopped) raises ``TimeoutError``. In every case the acquisition is stopped first.
+
+    Sustained streaming requires the buffer time (``buffer_size * dec / sample_rate``)
+    to be well above the round trip of a poll plus a read. In practice this means high
+    decimations, and the binary fast mode (``acq_set_fast_mode``) helps.
+    """
+
+    def __init__(
+        self,
+        rp: scpi,
+        channels: Sequence[int] = (1,),
+        dec: Optional[int] = None,
+        block_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        margin: float = 0.1,
+        max_overruns: Optional[int] = 10,
+        timeout: Optional[float] = None
+    ):
+        """
+        Parameters
+        ----------
+            rp (scpi):
+                Connection used for streaming.
+            channels (list(int), optional):
+                Input acquisition channels, one row each. Defaults to (1,).
+            dec (int, optional):
+                Decimation; only ``ACQ:DEC`` is sent if given (averaging, units and format
+                are left as configured), otherwise the current one is used. Defaults to None.
+            block_size (int, optional):
+                Length of the yielded blocks in samples. None yields every read as it
+                arrives. Defaults to None.
+            poll_interval (float, optional):
+                Time between polls in seconds. Defaults to a quarter of the buffer time.
+            margin (float, optional):
+                Fraction of the buffer kept as a safety margin against the writer when
+                checking for overruns. Defaults to 0.1.
+            max_overruns (int, optional):
+                Consecutive overruns tolerated before ``StreamOverrunError`` is raised.
+                None never raises. Defaults to 10.
+            timeout (float, optional):
+                Time without new samples before ``TimeoutError`` is raised. Defaults to
+                two buffer times, at least 1 s.
+        """
+        for chan in channels:
+            assert chan in (1, 2, 3, 4), f"Channel {chan} out of range"
+        assert block_size is None or block_size > 0, "Block size must be positive"
+        self.rp = rp
+        self.channels = list(channels)
+        self.block_size = block_size
+        self.margin = int(margin * rp.buffer_size)
+
+        if dec is not None:
+            rp.tx_txt_check_error(f"ACQ:DEC:Factor {dec}")
+            rp._decimation = dec
+        self.decimation = rp._acq_decimation()
+        self.sample_rate = rp.sample_rate / self.decimation
+        self.buffer_time = rp.buffer_size / self.sample_rate
+        self.poll_interval = self.buffer_time / 4 if poll_interval is None else poll_interval
+        self.max_overruns = max_overruns
+        self.timeout = max(2 * self.buffer_time, 1.0) if timeout is None else timeout
+
+        self.index = 0              # Samples elapsed since the stream started (read or lost)
+        self.overruns = 0
+        self.lost_samples = 0
+        self._running = False
+
+    def __iter__(self):
+        return self.blocks()
+
+    def _read(self, start: int, num_samples: int, units: str, data_format: str, gains: list) -> tuple:
+        """
+        Reads `num_samples` from buffer position `start` on every channel and the write
+        pointer after the read, in one round trip. Returns (data, write pointer).
+        """
+        rp = self.rp
+        rp.tx_txt_multi([f"ACQ:SOUR{chan}:DATA:STArt:N? {start},{num_samples}" for chan in self.channels]
+                        + ["ACQ:WPOS?"])
+        out = None
+        for i, gain in enumerate(gains):
+            row = rp._rx_acq_data(units, data_format, gain)
+            if out is None:
+                out = np.empty((len(self.channels), len(row)), dtype=row.dtype.newbyteorder('='))
+            out[i] = row
+        return out, int(rp.rx_txt())
+
+    def blocks(self):
+        """
+        Starts streaming and yields ``(index, AcqData)`` tuples until ``stop()`` is called
+        or the generator is closed. `index` is the stream position of the first sample.
+        """
+        rp = self.rp
+        size = rp.buffer_size
+
+        units = rp._units or rp.txrx_txt('ACQ:DATA:Units?')
+        data_format = rp._data_format or rp.txrx_txt("ACQ:DATA:FORMAT?")
+        gains = [rp._channel_gain(chan) if rp._fast_mode else None for chan in self.channels]
+        metadata = rp._acq_metadata(tuple(gain or rp._gain.get(chan) for gain, chan in zip(gains, self.channels)))
+        metadata['trig_delay'] = None       # No trigger in a stream
+
+        pending = []                        # Contiguous reads not yet yielded
+        pending_start = 0
+        pending_len = 0
+
+        def flush():
+            nonlocal pending, pending_len
+            data = np.concatenate(pending, axis=1) if len(pending) > 1 else pending[0]
+            pending, pending_len = [], 0
+            return pending_start, AcqData(data, **metadata)
+
+        rp.tx_txt_multi(["ACQ:START", "ACQ:TRig DISABLED"])
+        self._running = True
+        wpos = int(rp.txrx_txt("ACQ:WPOS?"))
+        received = time.perf_counter()      # When the last write pointer arrived
+        last_data_time = received
+        rpos = wpos                         # Next sample to read
+        ahead = 0                           # Samples written since rpos (read or not yet)
+        consecutive = 0                     # Overruns since the last successful read
+
+        def advance(new_wpos: int, sent: float) -> int:
+            """Samples written since the previous pointer reading; `sent` is when it was asked."""
+            moved = (new_wpos - wpos) % size
+            if moved == 0:
+                return 0                    # Writer stopped (see `timeout`)
+            # Board time elapsed is at least sent - received: whole laps the pointers cannot show
+            hidden = (sent - received) * self.sample_rate - moved
+            return moved + (math.ceil(hidden / size) * size if hidden > self.margin else 0)
+
+        try:
+            while self._running:
+                time.sleep(self.poll_interval)
+                sent = time.perf_counter()
+                new_wpos = int(rp.txrx_txt("ACQ:WPOS?"))
+                ahead += advance(new_wpos, sent)
+                wpos, received = new_wpos, time.perf_counter()
+
+                data = None
+                num_samples = ahead
+                if num_samples == 0:
+                    if received - last_data_time > self.timeout:
+                        raise TimeoutError(f"No new samples for {self.timeout:.3g} s (is the acquisition running?)")
+                    continue
+                if ahead <= size - self.margin:
+                    sent = time.perf_counter()
+                    data, new_wpos = self._read(rpos, num_samples, units, data_format, gains)
+                    ahead += advance(new_wpos, sent)
+                    wpos, received = new_wpos, time.perf_counter()
+                    # The writer must not have come within the margin of the oldest sample read
+                    if ahead > size - self.margin:
+                        data = None
+
+                if data is None:
+                    # Everything not yet read may be overwritten; resume at the write pointer
+                    lost = ahead
+                    self.overruns += 1
+                    self.lost_samples += lost
+                    self.index += lost
+                    rpos = (rpos + lost) % size
+                    ahead -= lost
+                    consecutive += 1
+                    if pending:
+                        yield flush()
+                    # Bounded even with max_overruns=None: no data for `timeout` also ends the stream
+                    if (self.max_overruns is not None and consecutive >= self.max_overruns) \
+                            or received - last_data_time > self.timeout:
+                        raise StreamOverrunError(
+                            f"{consecutive} consecutive overruns at decimation {self.decimation}; "
+                            "use a higher decimation or a shorter poll interval"
+                        )
+                else:
+                    consecutive = 0
+                    last_data_time = received
+                    if not pending:
+                        pending_start = self.index
+                    self.index += num_samples
+                    rpos = (rpos + num_samples) % size
+                    ahead -= num_samples
+                    pending.append(data)
+                    pending_len += num_samples
+
+                    if self.block_size is None:
+                        yield flush()
+                    while self.block_size is not None and pending_len >= self.block_size:
+                        stitched = np.concatenate(pending, axis=1)
+                        yield pending_start, AcqData(stitched[:, :self.block_size], **metadata)
+                        pending_start += self.block_size
+                        pending_len -= self.block_size
+                        pending = [stitched[:, self.block_size:]] if pending_len else []
+        finally:
+            self._running = False
+            rp.tx_txt("ACQ:STOP")
+
+    def stop(self) -> None:
+        """Ends the stream after the current poll."""
+        self._running = False
+
+
+class AsyncScpi(object):
+    """
+    asyncio counterpart of the ``scpi`` class, built on asyncio streams.
+
+    Queries are awaitable, so acquisition can overlap with processing and plotting
+    in one event loop, and several boards can be driven from one process::
+
+        async with AsyncScpi('192.168.1.100') as rp:
+            await rp.acq_set_fast_mode()
+            data = await rp.acq_data_multi([1, 2])
+
+    Replies are decoded by the same functions as in the ``scpi`` class.
+    """
+    delimiter = scpi.delimiter
+
+    def __init__(self, host: str, timeout: Optional[float] = None, port: int = 5000):
+        """Initialize object. The connection is opened by ``connect()`` or ``async with``."""
+        self.host    = host
+        self.port    = port
+        self.timeout = timeout
+
+        self._reader = None
+        self._writer = None
+        self._lock   = None             # Keeps each query and its reply together
+
+        # Acquisition state set through this object (None/missing = ask Red Pitaya)
+        self.invalidate_cache()
+
+    async def connect(self) -> "AsyncScpi":
+        """Open IP connection."""
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, limit=2**22),     # ASCII data replies are long lines
+            self.timeout
+        )
+        sock = self._writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._lock = asyncio.Lock()
+        return self
+
+    async def close(self) -> None:
+        """Close IP connection."""
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+        self._reader = None
+        self._writer = None
+
+    async def __aenter__(self) -> "AsyncScpi":
+        return await self.connect()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def tx(self, *msgs: str) -> None:
+        """Send one or more text strings in a single write, appending the delimiter to each."""
+        for msg in msgs:
+            _track_acq_command(self, msg)
+        self._writer.write(''.join(msg + self.delimiter for msg in msgs).encode('utf-8'))
+        await self._writer.drain()
+
+    async def rx_line(self) -> bytes:
+        """Receive one reply as raw bytes and return it without the delimiter."""
+        line = await asyncio.wait_for(self._reader.readuntil(self.delimiter.encode('utf-8')), self.timeout)
+        return line[:-len(self.delimiter)]
+
+    async def read_block(self) -> bytes:
+        """Receive one IEEE-488 binary block (``#<N><len><data>``) and return the data."""
+        header = await asyncio.wait_for(self._reader.readexactly(2), self.timeout)
+        if header[:1] != b'#' or int(header[1:2]) <= 0:
+            raise ValueError(f"SCPI >> unexpected binary block header {header!r}")
+        num_of_bytes = int(await asyncio.wait_for(self._reader.readexactly(int(header[1:2])), self.timeout))
+        data = await asyncio.wait_for(self._reader.readexactly(num_of_bytes), self.timeout)
+        await asyncio.wait_for(self._reader.readexactly(2), self.timeout)       # recive \r\n
+        return data
+
+    async def query(self, msg: str) -> str:
+        """Send a query and return its text reply."""
+        async with self._lock:
+            return await self._query(msg)
+
+    async def _query(self, msg: str) -> str:
+        """``query`` for callers that already hold ``self._lock``."""
+        await self.tx(msg)
+        return (await self.rx_line()).decode('utf-8')
+
+    async def check_error(self, stop: bool = True) -> List[str]:
+        """Read errors from Red Pitaya (see ``scpi.check_error``).
+
+        The async client has no error policy: errors are only read when this is awaited.
+        Returns the list of errors read. If `stop` is True and any error was read, a
+        ``ScpiError`` is raised instead.
+        """
+        errors = []
+        async with self._lock:
+            if int(await self._query('*STB?')) & 0x4:
+                while True:
+                    err = await self._query('SYST:ERR:NEXT?')
+                    if err.startswith('0,'):
+                        break
+                    errors.append(err)
+
+        if errors and stop:
+            raise ScpiError(errors)
+        return errors
+
+    def invalidate_cache(self) -> None:
+        """Forgets the cached acquisition settings (see ``scpi.invalidate_cache``)."""
+        self._units = None
+        self._data_format = None
+        self._gain = {}
+        self._fast_mode = False
+        self._decimation = None
+        self._trig_delay = None
+
+    async def acq_set_units_format(
+        self,
+        units: Optional[Units] = None,
+        data_format: Optional[DataFormat] = None
+    ) -> None:
+        """Set the units and format for the acquisition and remember them on the client."""
+        msgs = []
+        if units is not None:
+            msgs.append(f"ACQ:DATA:Units {units.value}")
+        if data_format is not None:
+            msgs.append(f"ACQ:DATA:FORMAT {data_format.value}")
+        async with self._lock:
+            await self.tx(*msgs)
+            if units is not None:
+                self._units = units.value
+            if data_format is not None:
+                self._data_format = data_format.value
+
+    async def acq_set_fast_mode(self, enable: bool = True) -> None:
+        """Enables or disables the fast acquisition mode (see ``scpi.acq_set_fast_mode``)."""
+        if enable:
+            await self.acq_set_units_format(Units.RAW, DataFormat.BIN)
+        else:
+            await self.acq_set_units_format(Units.VOLTS, DataFormat.ASCII)
+        self._fast_mode = enable
+
+    # The three helpers below are awaited with ``self._lock`` held, so that the settings
+    # they return cannot change before the data they describe is read.
+
+    async def _channel_gain(self, chan: int) -> Gain:
+        """Returns the input gain of a channel, asking Red Pitaya only the first time."""
+        if chan not in self._gain:
+            self._gain[chan] = Gain((await self._query(f"ACQ:SOUR{chan}:GAIN?")).upper())
+        return self._gain[chan]
+
+    async def _acq_metadata(self, gain: Optional[Union[Gain, tuple]]) -> dict:
+        """Returns the acquisition settings attached to acquired data (see ``AcqData``)."""
+        if self._decimation is None:
+            self._decimation = int(await self._query("ACQ:DEC?"))
+        if self._trig_delay is None:
+            self._trig_delay = int(await self._query("ACQ:TRig:DLY?"))
+        return dict(sample_rate=scpi.sample_rate / self._decimation, decimation=self._decimation,
+                    gain=gain, trig_delay=self._trig_delay)
+
+    async def _units_format(self) -> List[str]:
+        """Returns [units, data_format], asking Red Pitaya unless they were set through this object."""
+        if self._units is not None and self._data_format is not None:
+            return [self._units, self._data_format]
+        return [await self._query('ACQ:DATA:Units?'), await self._query("ACQ:DATA:FORMAT?")]
+
+    async def acq_data(self, chan: int) -> AcqData:
+        """Returns the whole acquired buffer of one channel."""
+        data = (await self.acq_data_multi([chan]))[0]
+        data.gain = data.gain[0]
+        return data
+
+    async def acq_data_multi(
+        self,
+        channels: Sequence[int] = (1, 2, 3, 4),
+        out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Returns the whole buffer of several channels in one round trip as a (channels, samples)
+        array (see ``scpi.acq_data_multi``).
+        """
+        for chan in channels:
+            assert chan in (1, 2, 3, 4), f"Channel {chan} out of range"
+
+        # Settings and data under one lock: another coroutine cannot change units, format
+        # or gain between the queries and the read
+        async with self._lock:
+            units, data_format = await self._units_format()
+            gains = [await self._channel_gain(chan) if self._fast_mode else None for chan in channels]
+            metadata = await self._acq_metadata(tuple(gain or self._gain.get(chan) for gain, chan in zip(gains, channels)))
+
+            await self.tx(*[f"ACQ:SOUR{chan}:DATA?" for chan in channels])
+            for i, gain in enumerate(gains):
+                payload = await self.read_block() if data_format == "BIN" else await self.rx_line()
+                if out is None:
+                    row = decode_acq_data(payload, units, data_format, gain)
+                    out = np.empty((len(channels), len(row)), dtype=row.dtype.newbyteorder('='))
+                    out[i] = row
+                else:
+                    decode_acq_data(payload, units, data_format, gain, out=out[i])
+
+        return AcqData(out, **metadata)
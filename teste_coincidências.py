@@ -1,14 +1,381 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import time
 import sys
 import os
+import time
+from functools import partial
+from itertools import chain
 
 # Adicionar o path para a biblioteca SCPI personalizada
 sys.path.append('/path/to/Redpitaya')  # Ajuste o path conforme necessário
 
 # Importar a biblioteca SCPI personalizada
-from redpitaya_scpi import scpi
+from redpitaya_scpi import scpi, Units, DataFormat, Gain
+import RedpitayaMath as rpmath
+
+def _min_distance(rows, cols, min_distance):
+    """
+    Seleciona, entre candidatos ordenados por (linha, coluna), os que ficam a pelo menos
+    min_distance amostras do último pico aceito na mesma linha (varredura gulosa).
+    """
+    keep = np.ones(len(cols), dtype=bool)
+    if len(cols) < 2 or min_distance <= 1:
+        return keep
+
+    # Candidatos já afastados do anterior (ou primeiros da linha) dispensam a varredura
+    close = (np.diff(cols) < min_distance) & (rows[1:] == rows[:-1])
+    if not close.any():
+        return keep
+
+    last_row, last_col = -1, 0
+    for k, (r, c) in enumerate(zip(rows.tolist(), cols.tolist())):
+        if r == last_row and c - last_col < min_distance:
+            keep[k] = False
+        else:
+            last_row, last_col = r, c
+    return keep
+
+class CoincidenceEngine:
+    """
+    Encontra pares de eventos dos dois canais separados por no máximo time_window.
+
+    Os tempos do canal 2 são ordenados uma vez e, para cada evento do canal 1, os limites
+    da janela [t - time_window, t + time_window] saem de np.searchsorted: o custo é
+    O((n+m) log m) mais o número de pares, em vez de comparar todos contra todos.
+
+    As coincidências acidentais são estimadas repetindo a contagem com o canal 2
+    deslocado por atrasos bem maiores que a janela (shifts): nesses atrasos não há
+    correlação real, e a média das contagens dá o fundo esperado na janela verdadeira.
+    """
+    def __init__(self, time_window=5e-9, shifts=None):
+        self.time_window = time_window
+        if shifts is None:
+            # Dez atrasos de cada lado, a partir de 10 janelas
+            passos = 10 * time_window * np.arange(1, 11)
+            shifts = np.concatenate([-passos[::-1], passos])
+        self.shifts = np.asarray(shifts, dtype=float)
+
+    @staticmethod
+    def _sorted(times):
+        times = np.asarray(times, dtype=float)
+        if len(times) < 2 or np.all(times[1:] >= times[:-1]):
+            return times, None
+        order = np.argsort(times, kind='stable')
+        return times[order], order
+
+    def pairs(self, t1, t2):
+        """
+        Retorna os índices (i, j) de todos os pares com |t1[i] - t2[j]| <= time_window
+        e as diferenças t2[j] - t1[i], ordenados por i.
+        """
+        t1 = np.asarray(t1, dtype=float)
+        t2s, order = self._sorted(t2)
+
+        lo = np.searchsorted(t2s, t1 - self.time_window, side='left')
+        hi = np.searchsorted(t2s, t1 + self.time_window, side='right')
+        counts = hi - lo
+
+        i = np.repeat(np.arange(len(t1)), counts)
+        # Posição dentro de cada grupo: 0, 1, ... a partir de lo[i]
+        inicio = np.cumsum(counts) - counts
+        j = lo[i] + np.arange(len(i)) - inicio[i]
+
+        dt = t2s[j] - t1[i]
+        if order is not None:
+            j = order[j]
+        return i, j, dt
+
+    def count(self, t1, t2, shifts=0.0):
+        """
+        Conta os pares dentro da janela para um ou vários atrasos aplicados ao canal 2.
+        """
+        t1 = np.asarray(t1, dtype=float)
+        t2s, _ = self._sorted(t2)
+        # Atrasar o canal 2 por d equivale a procurar em torno de t1 - d
+        centro = t1 - np.asarray(shifts, dtype=float)[..., None]
+        lo = np.searchsorted(t2s, centro - self.time_window, side='left')
+        hi = np.searchsorted(t2s, centro + self.time_window, side='right')
+        return (hi - lo).sum(axis=-1)
+
+    def accidentals(self, t1, t2):
+        """
+        Estima as coincidências acidentais: (média, desvio padrão) das contagens
+        nos atrasos deslocados.
+        """
+        counts = self.count(t1, t2, self.shifts)
+        if counts.size == 0:
+            return 0.0, 0.0
+        return float(counts.mean()), float(counts.std())
+
+# Registro compacto de um evento: ~17 bytes no lugar de milhares de amostras por bloco
+EVENT_DTYPE = np.dtype([
+    ('channel', 'u1'),      # Canal (1 ou 2)
+    ('timestamp', 'f8'),    # Instante da subida (s), relativo ao início da execução
+    ('amplitude', 'f4'),    # Valor máximo do pulso (V)
+    ('width', 'f4'),        # Largura entre a subida (high) e a descida (low), em s
+])
+
+def read_events(path):
+    """
+    Lê um log de eventos gravado pelo EventTagger.
+    """
+    return np.fromfile(path, dtype=EVENT_DTYPE)
+
+class EventTagger:
+    """
+    Transforma blocos de amostras em eventos (canal, tempo, amplitude, largura).
+
+    Um pulso começa quando o sinal passa de high e só termina quando cai abaixo de low
+    (histerese), de modo que o ruído em volta do limiar não gera eventos repetidos.
+    Os instantes de subida e descida são interpolados linearmente entre as amostras
+    vizinhas ao cruzamento.
+
+    Pulsos que já estavam acima de high na primeira amostra ou que não terminam dentro
+    do bloco são descartados, pois sua amplitude e largura ficariam incompletas.
+
+    Os timestamps são segundos desde o início da execução (t0 de cada bloco vem de quem
+    chama): em float64, um relógio de época (~1e9 s) só resolveria ~0.2 us, enquanto
+    uma noite inteira (~1e5 s) ainda tem resolução de ~10 ps.
+
+    Com path, cada bloco de eventos é acrescentado ao arquivo binário (tofile) assim que
+    é gerado; read_events(path) devolve o log inteiro como array estruturado.
+    """
+    def __init__(self, high, low=None, sample_rate=125e6, path=None):
+        self.high = high
+        self.low = high / 2 if low is None else low
+        if self.low > self.high:
+            raise ValueError("low deve ser menor ou igual a high")
+        self.sample_rate = sample_rate
+        self.path = path
+        self.total = 0
+        self.live_time = 0.0    # Tempo coberto pelos blocos marcados (s), sem os intervalos entre eles
+
+    def tag(self, data, t0=0.0, channels=None):
+        """
+        Extrai os eventos de um bloco (amostras,) ou (canais, amostras).
+
+        Args:
+            data (ndarray): Amostras em volts; a taxa de amostragem de um AcqData tem prioridade.
+            t0 (float): Instante da primeira amostra (s), relativo ao início da execução.
+            channels (sequence, optional): Número de cada linha do bloco. Padrão: 1, 2, ...
+
+        Returns:
+            ndarray com dtype EVENT_DTYPE, ordenado por canal e tempo.
+        """
+        fs = getattr(data, 'sample_rate', self.sample_rate)
+        x = np.atleast_2d(np.asarray(data, dtype=float))
+        linhas, n = x.shape
+        if channels is None:
+            channels = np.arange(1, linhas + 1)
+        self.live_time += n / fs
+
+        # Estado com histerese: +1 acima de high, -1 abaixo de low, 0 mantém o anterior.
+        # O estado é propagado com o índice da última marca (maximum.accumulate);
+        # a coluna inicial -1 faz o bloco começar desarmado.
+        marca = np.where(x > self.high, 1, np.where(x < self.low, -1, 0)).astype(np.int8)
+        marca = np.concatenate([np.full((linhas, 1), -1, np.int8), marca], axis=1)
+        ultimo = np.where(marca != 0, np.arange(n + 1), 0)
+        np.maximum.accumulate(ultimo, axis=1, out=ultimo)
+        armado = np.take_along_axis(marca, ultimo, axis=1) == 1
+
+        # Bordas; a coluna final desarmada fecha os pulsos que não terminam no bloco
+        armado = np.concatenate([armado, np.zeros((linhas, 1), bool)], axis=1)
+        borda = np.diff(armado.astype(np.int8), axis=1)
+        linha, subida = np.nonzero(borda == 1)
+        _, descida = np.nonzero(borda == -1)
+
+        validos = (subida > 0) & (descida < n)
+        linha, subida, descida = linha[validos], subida[validos], descida[validos]
+
+        eventos = np.empty(len(linha), dtype=EVENT_DTYPE)
+        if len(linha) == 0:
+            self._gravar(eventos)
+            return eventos
+
+        # Cruzamentos interpolados: high entre subida-1 e subida, low entre descida-1 e descida
+        a, b = x[linha, subida - 1], x[linha, subida]
+        inicio = subida - 1 + (self.high - a) / (b - a)
+        a, b = x[linha, descida - 1], x[linha, descida]
+        fim = descida - 1 + (a - self.low) / (a - b)
+
+        # Amplitude: máximo de cada pulso [subida, descida) em uma só chamada
+        plano = np.append(x.ravel(), 0.0)
+        limites = np.column_stack([linha * n + subida, linha * n + descida]).ravel()
+        amplitude = np.maximum.reduceat(plano, limites)[::2]
+
+        eventos['channel'] = np.asarray(channels)[linha]
+        eventos['timestamp'] = t0 + inicio / fs
+        eventos['amplitude'] = amplitude
+        eventos['width'] = (fim - inicio) / fs
+
+        self._gravar(eventos)
+        return eventos
+
+    def _gravar(self, eventos):
+        self.total += len(eventos)
+        if self.path is not None and len(eventos):
+            with open(self.path, 'ab') as f:
+                eventos.tofile(f)
+
+class CoincidenceHistogram:
+    """
+    Histogramas de bins fixos que acumulam coincidências de um número ilimitado de aquisições.
+
+    - counts: diferenças temporais (n_bins,) em dt_range, mais underflow/overflow;
+    - amplitudes: histograma 2-D (amp_bins, amp_bins) das amplitudes ch1 x ch2 em amp_range;
+    - soma, soma dos quadrados, mínimo e máximo exatos das diferenças temporais, de modo
+      que média e desvio saem de todas as coincidências (e não da média das médias).
+
+    Tudo é pré-alocado: add() só faz bincount e soma nos arrays, e a memória não cresce
+    com a duração da execução. merge() soma histogramas de mesmos bins (por exemplo de
+    outros processos), snapshot() devolve uma cópia independente e save()/load() gravam
+    e leem um .npz (a gravação troca o arquivo de forma atômica).
+    """
+    def __init__(self, dt_range=(-5e-9, 5e-9), n_bins=100, amp_range=(0.0, 1.0), amp_bins=64):
+        self.dt_edges = np.linspace(dt_range[0], dt_range[1], n_bins + 1)
+        self.amp_edges = np.linspace(amp_range[0], amp_range[1], amp_bins + 1)
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.amplitudes = np.zeros((amp_bins, amp_bins), dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+        self.total = 0
+        self.acquisitions = 0
+        self.accidentals = 0.0
+        self.soma = 0.0
+        self.soma2 = 0.0
+        self.minimo = np.inf
+        self.maximo = -np.inf
+
+    @staticmethod
+    def _indices(valores, bordas):
+        """Bin de cada valor; -1 abaixo e n acima (a borda superior entra no último bin)."""
+        n = len(bordas) - 1
+        k = np.floor((valores - bordas[0]) * (n / (bordas[-1] - bordas[0]))).astype(np.int64)
+        k[valores == bordas[-1]] = n - 1
+        return np.clip(k, -1, n)
+
+    def add(self, time_differences, amp_ch1=None, amp_ch2=None, accidentals=0.0):
+        """
+        Acumula as coincidências de uma aquisição.
+
+        Args:
+            time_differences (ndarray): Diferenças temporais (s) das coincidências.
+            amp_ch1, amp_ch2 (ndarray, optional): Amplitudes de cada coincidência nos dois canais.
+            accidentals (float): Acidentais estimadas para esta aquisição.
+        """
+        dt = np.asarray(time_differences, dtype=float).ravel()
+        self.acquisitions += 1
+        self.accidentals += accidentals
+        if dt.size == 0:
+            return
+
+        n = len(self.counts)
+        k = self._indices(dt, self.dt_edges)
+        self.underflow += int(np.count_nonzero(k < 0))
+        self.overflow += int(np.count_nonzero(k >= n))
+        self.counts += np.bincount(k[(k >= 0) & (k < n)], minlength=n)
+
+        self.total += dt.size
+        self.soma += dt.sum()
+        self.soma2 += np.dot(dt, dt)
+        self.minimo = min(self.minimo, dt.min())
+        self.maximo = max(self.maximo, dt.max())
+
+        if amp_ch1 is not None and amp_ch2 is not None:
+            m = self.amplitudes.shape[0]
+            k1 = self._indices(np.asarray(amp_ch1, dtype=float).ravel(), self.amp_edges)
+            k2 = self._indices(np.asarray(amp_ch2, dtype=float).ravel(), self.amp_edges)
+            dentro = (k1 >= 0) & (k1 < m) & (k2 >= 0) & (k2 < m)
+            plano = np.bincount(k1[dentro] * m + k2[dentro], minlength=m * m)
+            self.amplitudes += plano.reshape(m, m)
+
+    def merge(self, other):
+        """
+        Soma outro histograma com os mesmos bins a este.
+        """
+        if not (np.array_equal(self.dt_edges, other.dt_edges) and np.array_equal(self.amp_edges, other.amp_edges)):
+            raise ValueError("Histogramas com bins diferentes não podem ser combinados")
+        self.counts += other.counts
+        self.amplitudes += other.amplitudes
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        self.total += other.total
+        self.acquisitions += other.acquisitions
+        self.accidentals += other.accidentals
+        self.soma += other.soma
+        self.soma2 += other.soma2
+        self.minimo = min(self.minimo, other.minimo)
+        self.maximo = max(self.maximo, other.maximo)
+        return self
+
+    __iadd__ = merge
+
+    def snapshot(self):
+        """
+        Cópia independente do estado atual.
+        """
+        copia = CoincidenceHistogram.__new__(CoincidenceHistogram)
+        copia.__dict__.update({k: (v.copy() if isinstance(v, np.ndarray) else v) for k, v in self.__dict__.items()})
+        return copia
+
+    def statistics(self):
+        """
+        Estatísticas acumuladas, no mesmo formato de analyze_coincidence_statistics.
+        """
+        if self.total == 0:
+            media = desvio = minimo = maximo = 0
+        else:
+            media = self.soma / self.total
+            desvio = np.sqrt(max(self.soma2 / self.total - media**2, 0.0))
+            minimo, maximo = self.minimo, self.maximo
+        return {
+            'total_coincidences': self.total,
+            'mean_time_diff': media,
+            'std_time_diff': desvio,
+            'min_time_diff': minimo,
+            'max_time_diff': maximo,
+            'coincidence_rate': self.total / max(self.acquisitions, 1),
+            'accidental_coincidences': self.accidentals,
+            'acquisitions': self.acquisitions
+        }
+
+    def save(self, path):
+        """
+        Grava o histograma em um .npz; o arquivo anterior só é substituído no final.
+        """
+        temporario = path + '.tmp.npz'
+        np.savez(temporario, **{k: np.asarray(v) for k, v in self.__dict__.items()})
+        os.replace(temporario, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Lê um histograma gravado por save().
+        """
+        hist = cls.__new__(cls)
+        with np.load(path) as arquivo:
+            for k in arquivo.files:
+                v = arquivo[k]
+                setattr(hist, k, v if v.ndim else v.item())
+        return hist
+
+def frame_coincidences(block, time_window=5e-9, high=0.05, low=None, sample_rate=125e6):
+    """
+    Processa um quadro (2, amostras) de forma independente: eventos e coincidências.
+
+    Função de módulo para poder rodar nos processos do rpmath.DspPool.
+
+    Returns:
+        |dt| das coincidências, amplitudes nos canais 1 e 2 e acidentais estimadas
+    """
+    eventos = EventTagger(high, low, sample_rate).tag(block)
+    ch1 = eventos[eventos['channel'] == 1]
+    ch2 = eventos[eventos['channel'] == 2]
+
+    engine = CoincidenceEngine(time_window)
+    i, j, dt = engine.pairs(ch1['timestamp'], ch2['timestamp'])
+    accidentals, _ = engine.accidentals(ch1['timestamp'], ch2['timestamp'])
+    return np.abs(dt), ch1['amplitude'][i], ch2['amplitude'][j], accidentals
 
 class FrequencyCoincidenceAnalyzer:
     def __init__(self, ip_address='192.168.1.100', port=5000):
@@ -31,29 +398,32 @@ class FrequencyCoincidenceAnalyzer:
         self.sample_rate = 125e6  # 125 MHz para Red Pitaya
         self.buffer_size = 16384  # Tamanho do buffer
         self.time_window = 5e-9   # 5 ns de janela temporal
+        self.engine = CoincidenceEngine(self.time_window)
+        # Os dois caminhos de análise medem o tempo e a amplitude de formas diferentes, então
+        # cada um tem o seu histograma (ambos com |dt|, cobrindo [0, janela]):
+        # - histogram: run_analysis, picos de find_peaks (instante e valor da amostra do pico,
+        #   só pares com frequências compatíveis);
+        # - event_histogram: run_parallel_analysis, eventos do EventTagger (instante interpolado
+        #   da subida e máximo do pulso, sem filtro de frequência).
+        self.histogram = CoincidenceHistogram(dt_range=(0.0, self.time_window), n_bins=50)
+        self.event_histogram = CoincidenceHistogram(dt_range=(0.0, self.time_window), n_bins=50)
         
     def setup_acquisition(self, decimation=8, trigger_level=0.1):
         """
         Configura a aquisição de dados usando comandos SCPI
         """
         try:
-            # Configurar decimation
-            self.rp.tx_txt(f'ACQ:DEC {decimation}')
-            
-            # Configurar trigger para ambos os canais
-            self.rp.tx_txt(f'ACQ:TRIG:LEV 0,{trigger_level}')
-            self.rp.tx_txt(f'ACQ:TRIG:LEV 1,{trigger_level}')
-            
-            # Configurar delay do trigger
-            self.rp.tx_txt('ACQ:TRIG:DLY 0')
-            
-            # Configurar ganho
-            self.rp.tx_txt('ACQ:SOUR1:GAIN LV')
-            self.rp.tx_txt('ACQ:SOUR2:GAIN LV')
+            # Configurar decimation, ganho e formato dos dados pela biblioteca,
+            # que guarda a taxa de amostragem real junto com os dados adquiridos
+            self.rp.acq_set(
+                dec=decimation,
+                units=Units.VOLTS,
+                data_format=DataFormat.ASCII,
+                gain=[Gain.LV, Gain.LV]
+            )
             
-            # Configurar formato dos dados
-            self.rp.tx_txt('ACQ:DATA:FORMAT ASCII')
-            self.rp.tx_txt('ACQ:DATA:UNITS VOLTS')
+            # Configurar trigger e delay do trigger
+            self.rp.acq_trig_set(trig_lvl=trigger_level, trig_delay=0)
             
             print("Aquisição configurada com sucesso")
             
@@ -65,22 +435,13 @@ class FrequencyCoincidenceAnalyzer:
         Adquire dados de ambos os canais usando SCPI
         """
         try:
-            # Reset e iniciar aquisição
-            self.rp.tx_txt('ACQ:RST')
+            # Iniciar aquisição (sem ACQ:RST, que desfaria a configuração de setup_acquisition)
             self.rp.tx_txt('ACQ:START')
             
-            # Aguardar trigger
-            time.sleep(0.1)
-            
-            # Verificar se o trigger ocorreu
-            self.rp.tx_txt('ACQ:TRIG:STAT?')
-            trigger_status = self.rp.rx_txt()
-            
-            if 'TD' not in trigger_status:
-                print("Trigger não disparado. Tentando novamente...")
-                time.sleep(0.1)
-                self.rp.tx_txt('ACQ:TRIG:STAT?')
-                trigger_status = self.rp.rx_txt()
+            # Aguardar trigger e o preenchimento do buffer
+            triggered, _ = self.rp.wait_triggered(0.2)
+            if not triggered:
+                print("Trigger não disparado. Usando o buffer atual.")
             
             # Parar aquisição
             self.rp.tx_txt('ACQ:STOP')
@@ -96,9 +457,8 @@ class FrequencyCoincidenceAnalyzer:
             data_ch1 = data_ch1[:min_length]
             data_ch2 = data_ch2[:min_length]
             
-            # Criar vetor de tempo
-            actual_sample_rate = self.sample_rate / 8  # decimation padrão
-            t = np.arange(min_length) / actual_sample_rate
+            # Criar vetor de tempo com a taxa de amostragem real da aquisição
+            t = data_ch1.time_axis()
             
             return t, data_ch1, data_ch2
             
@@ -106,25 +466,65 @@ class FrequencyCoincidenceAnalyzer:
             print(f"Erro na aquisição de dados: {e}")
             return None, None, None
     
-    def find_peaks(self, data, threshold=0.05, min_distance=10):
+    def find_peaks(self, data, threshold=0.05, min_distance=10, subsample=None):
         """
-        Encontra picos nos dados - implementação manual sem scipy
+        Encontra picos nos dados - implementação vetorizada sem scipy
+
+        data pode ser um canal (amostras,) ou os dois canais empilhados (canais, amostras).
+        Os máximos locais acima de threshold saem de máscaras booleanas sobre o bloco
+        inteiro; a distância mínima é imposta depois, percorrendo só os candidatos (o
+        primeiro pico de cada grupo é mantido, como antes).
+
+        Com subsample='parabolic' ou 'centroid' também é devolvida a posição fracionária
+        de cada pico (em amostras), estimada com os dois vizinhos.
+
+        Returns:
+            ndarray com os índices dos picos (lista de ndarrays para um bloco 2-D);
+            com subsample, a tupla (índices, posições).
         """
         try:
-            peaks = []
-            
-            # Detecção simples de picos
-            for i in range(1, len(data)-1):
-                if (data[i] > data[i-1] and 
-                    data[i] > data[i+1] and 
-                    data[i] > threshold and
-                    (len(peaks) == 0 or (i - peaks[-1]) >= min_distance)):
-                    peaks.append(i)
-            
-            return np.array(peaks)
+            bloco = np.atleast_2d(np.asarray(data))
+
+            # Máximos locais estritos acima do limiar, em todos os canais de uma vez
+            centro = bloco[:, 1:-1]
+            mascara = (centro > bloco[:, :-2]) & (centro > bloco[:, 2:]) & (centro > threshold)
+            linhas, colunas = np.nonzero(mascara)
+            colunas = colunas + 1
+
+            manter = _min_distance(linhas, colunas, min_distance)
+            linhas, colunas = linhas[manter], colunas[manter]
+            cortes = np.searchsorted(linhas, np.arange(1, bloco.shape[0]))
+            peaks = np.split(colunas, cortes)
+
+            if subsample is not None:
+                a = bloco[linhas, colunas - 1]
+                b = bloco[linhas, colunas]
+                c = bloco[linhas, colunas + 1]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    if subsample == 'parabolic':
+                        delta = 0.5 * (a - c) / (a - 2*b + c)
+                    elif subsample == 'centroid':
+                        delta = (c - a) / (a + b + c)
+                    else:
+                        raise ValueError(f"subsample deve ser 'parabolic' ou 'centroid', não {subsample!r}")
+                delta = np.clip(np.nan_to_num(delta), -0.5, 0.5)
+                positions = np.split(colunas + delta, cortes)
+
+            if np.ndim(data) < 2:
+                peaks = peaks[0]
+                if subsample is not None:
+                    positions = positions[0]
+
+            if subsample is not None:
+                return peaks, positions
+            return peaks
+        except ValueError:
+            raise
         except Exception as e:
             print(f"Erro na detecção de picos: {e}")
-            return np.array([])
+            if subsample is not None:
+                return np.array([], dtype=int), np.array([])
+            return np.array([], dtype=int)
     
     def calculate_frequencies(self, t, peaks):
         """
@@ -134,8 +534,12 @@ class FrequencyCoincidenceAnalyzer:
             if len(peaks) < 2:
                 return np.array([])
             
-            # Calcular períodos entre picos
-            peak_times = t[peaks]
+            # Calcular períodos entre picos (posições fracionárias são interpoladas em t)
+            peaks = np.asarray(peaks)
+            if np.issubdtype(peaks.dtype, np.integer):
+                peak_times = t[peaks]
+            else:
+                peak_times = np.interp(peaks, np.arange(len(t)), t)
             periods = np.diff(peak_times)
             
             # Calcular frequências (evitar divisão por zero)
@@ -151,59 +555,115 @@ class FrequencyCoincidenceAnalyzer:
     def find_coincidences(self, t, data_ch1, data_ch2, freq_tolerance=0.01):
         """
         Analisa coincidências de frequência na janela temporal de 5 ns
+
+        Os pares de eventos dentro da janela vêm do CoincidenceEngine (busca ordenada);
+        a tolerância de frequência é aplicada depois, só sobre esses pares.
+
+        Returns:
+            coincidences (k, 2): índices (i, j) nas frequências de cada canal
+            coincident_freqs (k, 2), time_differences (k,), peaks_ch1, peaks_ch2 e
+            accidentals: (média, desvio) das coincidências acidentais estimadas
         """
+        vazio = (np.empty((0, 2), dtype=int), np.empty((0, 2)), np.empty(0))
         try:
-            # Encontrar picos em ambos os canais
-            peaks_ch1 = self.find_peaks(data_ch1)
-            peaks_ch2 = self.find_peaks(data_ch2)
+            # Encontrar picos em ambos os canais de uma vez
+            peaks_ch1, peaks_ch2 = self.find_peaks(np.stack([data_ch1, data_ch2]))
             
             if len(peaks_ch1) < 2 or len(peaks_ch2) < 2:
-                return [], [], [], peaks_ch1, peaks_ch2
+                return (*vazio, peaks_ch1, peaks_ch2, (0.0, 0.0))
             
             # Calcular frequências
             freqs_ch1 = self.calculate_frequencies(t, peaks_ch1)
             freqs_ch2 = self.calculate_frequencies(t, peaks_ch2)
             
             if len(freqs_ch1) == 0 or len(freqs_ch2) == 0:
-                return [], [], [], peaks_ch1, peaks_ch2
-            
-            # Encontrar coincidências
-            coincidences = []
-            coincident_freqs = []
-            time_differences = []
-            
-            # Para cada frequência no canal 1, verificar se há correspondência no canal 2
-            for i, freq1 in enumerate(freqs_ch1):
-                for j, freq2 in enumerate(freqs_ch2):
-                    # Verificar se as frequências são similares dentro da tolerância
-                    freq_avg = (freq1 + freq2) / 2
-                    if abs(freq1 - freq2) < freq_tolerance * freq_avg:
-                        # Calcular diferença temporal entre os eventos correspondentes
-                        time_diff = abs(t[peaks_ch1[i+1]] - t[peaks_ch2[j+1]])
-                        
-                        if time_diff <= self.time_window:
-                            coincidences.append((i, j))
-                            coincident_freqs.append((freq1, freq2))
-                            time_differences.append(time_diff)
-            
-            return coincidences, coincident_freqs, time_differences, peaks_ch1, peaks_ch2
+                return (*vazio, peaks_ch1, peaks_ch2, (0.0, 0.0))
+            
+            # A frequência i corresponde ao evento no pico i+1 de cada canal
+            times_ch1 = t[peaks_ch1[1:]]
+            times_ch2 = t[peaks_ch2[1:]]
+            i, j, dt = self.engine.pairs(times_ch1, times_ch2)
+            
+            # Manter só os pares com frequências similares dentro da tolerância
+            freq1, freq2 = freqs_ch1[i], freqs_ch2[j]
+            similares = np.abs(freq1 - freq2) < freq_tolerance * (freq1 + freq2) / 2
+            
+            coincidences = np.column_stack([i[similares], j[similares]])
+            coincident_freqs = np.column_stack([freq1[similares], freq2[similares]])
+            time_differences = np.abs(dt[similares])
+            accidentals = self.engine.accidentals(times_ch1, times_ch2)
+            
+            return coincidences, coincident_freqs, time_differences, peaks_ch1, peaks_ch2, accidentals
             
         except Exception as e:
             print(f"Erro na análise de coincidências: {e}")
-            return [], [], [], np.array([]), np.array([])
+            return (*vazio, np.array([], dtype=int), np.array([], dtype=int), (0.0, 0.0))
     
-    def analyze_coincidence_statistics(self, coincidences, time_differences):
+    def tag_events(self, tagger, num_acquisitions=100):
+        """
+        Adquire blocos e guarda apenas os eventos de cada um (via EventTagger)
+
+        Os blocos de tensão são descartados logo após a marcação; se o tagger tiver um
+        path, os eventos vão sendo acrescentados ao log em disco.
+
+        Returns:
+            ndarray com os eventos de todas as aquisições (EVENT_DTYPE)
+        """
+        blocos = []
+        inicio = time.perf_counter()
+        
+        for i in range(num_acquisitions):
+            t0 = time.perf_counter() - inicio
+            t, data_ch1, data_ch2 = self.acquire_data()
+            
+            if data_ch1 is None or data_ch2 is None:
+                print("  Erro na aquisição de dados. Pulando...")
+                continue
+            
+            blocos.append(tagger.tag(np.stack([data_ch1, data_ch2]), t0=t0))
+        
+        if not blocos:
+            return np.empty(0, dtype=EVENT_DTYPE)
+        return np.concatenate(blocos)
+    
+    def event_coincidences(self, events):
+        """
+        Coincidências entre os eventos do canal 1 e do canal 2 (de tag_events ou read_events)
+
+        Returns:
+            i, j (índices em events do evento do canal 1 e do canal 2 de cada par),
+            diferenças t2 - t1 e accidentals: (média, desvio) das coincidências acidentais estimadas
+        """
+        idx1 = np.flatnonzero(events['channel'] == 1)
+        idx2 = np.flatnonzero(events['channel'] == 2)
+        t1 = events['timestamp'][idx1]
+        t2 = events['timestamp'][idx2]
+        
+        # O engine aceita os tempos fora de ordem e devolve índices nos arrays recebidos
+        i, j, dt = self.engine.pairs(t1, t2)
+        return idx1[i], idx2[j], dt, self.engine.accidentals(t1, t2)
+    
+    def event_rates(self, events, live_time):
+        """
+        Taxa de eventos (Hz) de cada canal, dado o tempo vivo (EventTagger.live_time)
+        """
+        contagens = np.bincount(events['channel'], minlength=3)
+        return {ch: contagens[ch] / live_time if live_time > 0 else 0.0 for ch in (1, 2)}
+    
+    def analyze_coincidence_statistics(self, coincidences, time_differences, accidentals=(0.0, 0.0)):
         """
         Analisa estatísticas das coincidências
         """
-        if not coincidences:
+        if len(coincidences) == 0:
             return {
                 'total_coincidences': 0,
                 'mean_time_diff': 0,
                 'std_time_diff': 0,
                 'min_time_diff': 0,
                 'max_time_diff': 0,
-                'coincidence_rate': 0
+                'coincidence_rate': 0,
+                'accidental_coincidences': accidentals[0],
+                'accidental_std': accidentals[1]
             }
         
         try:
@@ -215,7 +675,9 @@ class FrequencyCoincidenceAnalyzer:
                 'std_time_diff': np.std(time_diffs),
                 'min_time_diff': np.min(time_diffs),
                 'max_time_diff': np.max(time_diffs),
-                'coincidence_rate': len(coincidences) / max(len(time_diffs), 1)
+                'coincidence_rate': len(coincidences) / max(len(time_diffs), 1),
+                'accidental_coincidences': accidentals[0],
+                'accidental_std': accidentals[1]
             }
             
             return stats
@@ -228,7 +690,9 @@ class FrequencyCoincidenceAnalyzer:
                 'std_time_diff': 0,
                 'min_time_diff': 0,
                 'max_time_diff': 0,
-                'coincidence_rate': 0
+                'coincidence_rate': 0,
+                'accidental_coincidences': accidentals[0],
+                'accidental_std': accidentals[1]
             }
     
     def calculate_fft_manual(self, data, sample_rate):
@@ -292,14 +756,15 @@ class FrequencyCoincidenceAnalyzer:
             ax2.set_xlim(0, min(10e6, actual_fs/2))  # Limitar a 10 MHz para melhor visualização
             
             # Plot histograma de diferenças temporais
-            if coincidences:
-                time_diffs = [abs(t[peaks_ch1[i]] - t[peaks_ch2[j]]) for i, j in coincidences]
-                ax3.hist([td * 1e9 for td in time_diffs], bins=30, alpha=0.7, edgecolor='black')
+            if self.histogram.total > 0:
+                bordas = self.histogram.dt_edges * 1e9
+                ax3.bar(bordas[:-1], self.histogram.counts, width=np.diff(bordas), align='edge',
+                        alpha=0.7, edgecolor='black')
                 ax3.axvline(self.time_window * 1e9, color='red', linestyle='--', 
                            label=f'Janela de 5 ns')
                 ax3.set_xlabel('Diferença Temporal (ns)')
                 ax3.set_ylabel('Contagem')
-                ax3.set_title('Histograma de Diferenças Temporais nas Coincidências')
+                ax3.set_title(f'Histograma de Diferenças Temporais ({self.histogram.acquisitions} aquisições)')
                 ax3.legend()
                 ax3.grid(True)
             else:
@@ -315,12 +780,17 @@ class FrequencyCoincidenceAnalyzer:
         except Exception as e:
             print(f"Erro no plotting: {e}")
     
-    def run_analysis(self, num_acquisitions=3):
+    def run_analysis(self, num_acquisitions=3, save_path=None, save_every=100):
         """
         Executa análise completa múltiplas vezes
+
+        As coincidências (picos de find_peaks) de todas as aquisições vão para self.histogram
+        (memória constante); com save_path, o histograma é gravado a cada save_every
+        aquisições e no final.
+
+        Returns:
+            Estatísticas acumuladas (CoincidenceHistogram.statistics)
         """
-        all_stats = []
-        
         print("Iniciando análise de coincidências...")
         print(f"Janela temporal: {self.time_window*1e9:.1f} ns")
         print("-" * 50)
@@ -336,29 +806,77 @@ class FrequencyCoincidenceAnalyzer:
                 continue
             
             # Analisar coincidências
-            coincidences, coincident_freqs, time_diffs, peaks_ch1, peaks_ch2 = self.find_coincidences(
+            coincidences, coincident_freqs, time_diffs, peaks_ch1, peaks_ch2, accidentals = self.find_coincidences(
                 t, data_ch1, data_ch2
             )
             
+            # Acumular no histograma (amplitudes nos picos de cada coincidência)
+            amp_ch1 = np.asarray(data_ch1)[peaks_ch1[coincidences[:, 0] + 1]]
+            amp_ch2 = np.asarray(data_ch2)[peaks_ch2[coincidences[:, 1] + 1]]
+            self.histogram.add(time_diffs, amp_ch1, amp_ch2, accidentals[0])
+            
             # Calcular estatísticas
-            stats = self.analyze_coincidence_statistics(coincidences, time_diffs)
-            all_stats.append(stats)
+            stats = self.analyze_coincidence_statistics(coincidences, time_diffs, accidentals)
             
             print(f"  Coincidências encontradas: {stats['total_coincidences']}")
             if stats['total_coincidences'] > 0:
                 print(f"  Dif. temporal média: {stats['mean_time_diff']*1e9:.2f} ns")
                 print(f"  Taxa de coincidência: {stats['coincidence_rate']:.3f}")
+                print(f"  Acidentais estimadas: {stats['accidental_coincidences']:.2f} ± {stats['accidental_std']:.2f}")
                 
                 # Mostrar algumas frequências coincidentes
                 for idx, (freq1, freq2) in enumerate(coincident_freqs[:3]):
                     print(f"  Coincidência {idx+1}: {freq1/1e6:.2f} MHz vs {freq2/1e6:.2f} MHz")
             print()
             
+            if save_path is not None and (i + 1) % save_every == 0:
+                self.histogram.save(save_path)
+            
             # Plotar resultados da primeira aquisição com coincidências
             if i == 0 and stats['total_coincidences'] > 0:
                 self.plot_results(t, data_ch1, data_ch2, peaks_ch1, peaks_ch2, coincidences)
         
-        return all_stats
+        if save_path is not None:
+            self.histogram.save(save_path)
+        
+        return self.histogram.statistics()
+    
+    def run_parallel_analysis(self, num_acquisitions=100, processes=None, high=0.05, low=None, save_path=None):
+        """
+        Adquire quadros e distribui a análise (frame_coincidences) entre vários processos
+
+        Os quadros passam para os workers por memória compartilhada (rpmath.DspPool) e os
+        resultados voltam na ordem de aquisição, acumulados em self.event_histogram.
+        As coincidências usam os eventos do EventTagger (subida e máximo do pulso), e não
+        os picos de run_analysis, por isso não se misturam com self.histogram.
+
+        Returns:
+            Estatísticas acumuladas (CoincidenceHistogram.statistics de event_histogram)
+        """
+        def quadros():
+            for i in range(num_acquisitions):
+                t, data_ch1, data_ch2 = self.acquire_data()
+                if data_ch1 is None or data_ch2 is None:
+                    print("  Erro na aquisição de dados. Pulando...")
+                    continue
+                yield np.stack([data_ch1, data_ch2])
+        
+        gerador = quadros()
+        primeiro = next(gerador, None)
+        if primeiro is None:
+            return self.event_histogram.statistics()
+        
+        funcao = partial(frame_coincidences, time_window=self.time_window, high=high, low=low,
+                         sample_rate=getattr(primeiro, 'sample_rate', self.sample_rate))
+        
+        with rpmath.DspPool(funcao, primeiro.shape, dtype=primeiro.dtype, processos=processes) as pool:
+            for dt, amp_ch1, amp_ch2, accidentals in pool.mapear(chain([primeiro], gerador)):
+                self.event_histogram.add(dt, amp_ch1, amp_ch2, accidentals)
+        
+        if save_path is not None:
+            self.event_histogram.save(save_path)
+        
+        return self.event_histogram.statistics()
     
     def close(self):
         """
@@ -405,11 +923,12 @@ def detailed_coincidence_analysis(analyzer):
             print(f"Frequência média - Canal 2: {np.mean(freqs_ch2)/1e6:.2f} MHz")
             
             # Analisar coincidências
-            coincidences, coincident_freqs, time_diffs, _, _ = analyzer.find_coincidences(
+            coincidences, coincident_freqs, time_diffs, _, _, accidentals = analyzer.find_coincidences(
                 t, data_ch1, data_ch2
             )
             
             print(f"Coincidências encontradas: {len(coincidences)}")
+            print(f"Acidentais estimadas: {accidentals[0]:.2f} ± {accidentals[1]:.2f}")
             
             for i, ((freq1, freq2), time_diff) in enumerate(zip(coincident_freqs, time_diffs)):
                 print(f"Coincidência {i+1}:")
@@ -438,16 +957,14 @@ if __name__ == "__main__":
         print("ESTATÍSTICAS FINAIS:")
         print("=" * 60)
         
-        total_coincidences = sum(s['total_coincidences'] for s in stats)
-        valid_stats = [s for s in stats if s['total_coincidences'] > 0]
+        total_coincidences = stats['total_coincidences']
         
-        if valid_stats:
-            avg_time_diff = np.mean([s['mean_time_diff'] for s in valid_stats])
-            avg_rate = np.mean([s['coincidence_rate'] for s in valid_stats])
-            
+        if total_coincidences > 0:
             print(f"Total de coincidências: {total_coincidences}")
-            print(f"Média das diferenças temporais: {avg_time_diff*1e9:.2f} ns")
-            print(f"Taxa média de coincidência: {avg_rate:.3f}")
+            print(f"Média das diferenças temporais: {stats['mean_time_diff']*1e9:.2f} ns")
+            print(f"Desvio das diferenças temporais: {stats['std_time_diff']*1e9:.2f} ns")
+            print(f"Coincidências por aquisição: {stats['coincidence_rate']:.3f}")
+            print(f"Acidentais estimadas (total): {stats['accidental_coincidences']:.2f}")
             
             # Executar análise detalhada se houver coincidências
             if total_coincidences > 0:
@@ -23,9 +23,7 @@ rp_s.tx_txt('ACQ:TRIG:DLY 0')
 
 def ler_canal(canal):
     rp_s.tx_txt(f'ACQ:SOUR{canal}:DATA?')
-    raw = rp_s.rx_txt()
-    raw = raw.strip('{}\n\r').replace("  ", "").split(',')
-    return np.array(list(map(float, raw)))
+    return scpi.parse_ascii_data(rp_s.rx_txt())
 
 # Listas para armazenar todos os dados
 todas_as_leituras = []
@@ -44,19 +42,8 @@ while time.time() - start_time < tempo_total_segundos:
         rp_s.tx_txt('ACQ:START')
         rp_s.tx_txt('ACQ:TRIG CH2_PE')
 
-        # Espera trigger
-        start_wait = time.time()
-        while True:
-            rp_s.tx_txt('ACQ:TRIG:STAT?')
-            if rp_s.rx_txt() == 'TD' or (time.time() - start_wait) > 0.5:
-                break
-
-        # Espera buffer
-        start_wait = time.time()
-        while True:
-            rp_s.tx_txt('ACQ:TRIG:FILL?')
-            if rp_s.rx_txt() == '1' or (time.time() - start_wait) > 0.5:
-                break
+        # Espera trigger e buffer (sem travar)
+        rp_s.wait_triggered(1.0)
 
         # Lê dados
         buff1 = ler_canal(1)
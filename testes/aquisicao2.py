@@ -24,9 +24,7 @@ rp_s.tx_txt('ACQ:TRIG:DLY 0')
 # Função para ler dados de um canal
 def ler_canal(canal):
     rp_s.tx_txt(f'ACQ:SOUR{canal}:DATA?')
-    raw = rp_s.rx_txt()
-    raw = raw.strip('{}\n\r').replace("  ", "").split(',')
-    return np.array(list(map(float, raw)))
+    return scpi.parse_ascii_data(rp_s.rx_txt())
 
 # Listas para armazenar todos os dados
 todas_as_leituras = []  # Armazena cada aquisição como um dicionário
@@ -39,17 +37,8 @@ while time.time() - start_time < tempo_total_segundos:
     rp_s.tx_txt('ACQ:START')
     rp_s.tx_txt('ACQ:TRIG CH2_PE')
 
-    # Espera o trigger
-    while True:
-        rp_s.tx_txt('ACQ:TRIG:STAT?')
-        if rp_s.rx_txt() == 'TD':
-            break
-
-    # Espera o buffer encher
-    while True:
-        rp_s.tx_txt('ACQ:TRIG:FILL?')
-        if rp_s.rx_txt() == '1':
-            break
+    # Espera o trigger e o buffer encher
+    rp_s.wait_triggered(None)
 
     # Lê os dados dos 4 canais
     buff1 = ler_canal(1)
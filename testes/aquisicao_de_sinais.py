@@ -34,24 +34,13 @@ while time.time() - start_time < tempo_total_segundos:
     rp_s.tx_txt('ACQ:START')
     rp_s.tx_txt('ACQ:TRIG CH2_PE')
 
-    # Espera o trigger
-    while True:
-        rp_s.tx_txt('ACQ:TRIG:STAT?')
-        if rp_s.rx_txt() == 'TD':
-            break
-
-    # Espera o buffer encher
-    while True:
-        rp_s.tx_txt('ACQ:TRIG:FILL?')
-        if rp_s.rx_txt() == '1':
-            break
+    # Espera o trigger e o buffer encher
+    rp_s.wait_triggered(None)
 
     # Função para ler dados de canal
     def ler_canal(canal):
         rp_s.tx_txt(f'ACQ:SOUR{canal}:DATA?')
-        raw = rp_s.rx_txt()
-        raw = raw.strip('{}\n\r').replace("  ", "").split(',')
-        return np.array(list(map(float, raw)))
+        return scpi.parse_ascii_data(rp_s.rx_txt())
 
     # Leitura dos canais
     buff1 = ler_canal(1)
@@ -1,7 +1,6 @@
 import numpy as np
-import time
 import sys
-from redpitaya_scpi import scpi
+from redpitaya_scpi import scpi, parse_ascii_data
  
 #configurando a RedPitaya
 IP = '169.254.56.223'
@@ -18,19 +17,14 @@ rp.tx_txt("ACQ:TRIG CH1_PE") #trigger na borda positiva do Canal 1 (acusa toda v
 #Iniciando a aquisição
 
  
-while True:
-    rp.tx_txt("ACQ:TRIG:STAT?") #pergunta para a RedPitaya se o trigger foi ativado
-    if rp.rx_txt() == "TD": #verfica a resposta da RedPitaya (TD - Trigger Detected)
-        break
-    time.sleep(0.01)
+rp.wait_triggered(None) #espera o trigger (TD - Trigger Detected) e o buffer encher
  
 #Leitura dos dados do canala
 rp.tx_txt("ACQ:SOUR:CH1:DATA?")
 raw = rp.rx_txt()
  
 #Convertendo os dados para um array numpy
-raw_str = raw.split('{}\n\r')
-data_ch1 = np.array(list(map(float, raw_str('{}\n\r').split(','))))
+data_ch1 = parse_ascii_data(raw)
  
 #Exibindo os dados
 print("Amostras do Canal 1")
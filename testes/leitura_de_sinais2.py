@@ -18,35 +18,19 @@ rp_s.tx_txt('ACQ:TRIG:DLY 0')
 rp_s.tx_txt('ACQ:START')
 rp_s.tx_txt('ACQ:TRIG CH4_PE')
 
-while 1:
-    rp_s.tx_txt('ACQ:TRIG:STAT?')
-    if rp_s.rx_txt() == 'TD':
-        break
-
-while 1:
-    rp_s.tx_txt('ACQ:TRIG:FILL?')
-    if rp_s.rx_txt() == '1':
-        break
+rp_s.wait_triggered(None)
 
 rp_s.tx_txt('ACQ:SOUR1:DATA?')
-buff_string = rp_s.rx_txt()
-buff_string = buff_string.strip('{}\n\r').replace("  ", "").split(',')
-buff = list(map(float, buff_string))
+buff = scpi.parse_ascii_data(rp_s.rx_txt())
 
 rp_s.tx_txt('ACQ:SOUR2:DATA?')
-buff_string = rp_s.rx_txt()
-buff_string = buff_string.strip('{}\n\r').replace("  ", "").split(',')
-buff2 = list(map(float, buff_string))
+buff2 = scpi.parse_ascii_data(rp_s.rx_txt())
 
 rp_s.tx_txt('ACQ:SOUR3:DATA?')
-buff_string = rp_s.rx_txt()
-buff_string = buff_string.strip('{}\n\r').replace("  ", "").split(',')
-buff3 = list(map(float, buff_string))
+buff3 = scpi.parse_ascii_data(rp_s.rx_txt())
 
 rp_s.tx_txt('ACQ:SOUR4:DATA?')
-buff_string = rp_s.rx_txt()
-buff_string = buff_string.strip('{}\n\r').replace("  ", "").split(',')
-buff4 = list(map(float, buff_string))
+buff4 = scpi.parse_ascii_data(rp_s.rx_txt())
 
 plot.plot(buff, 'r')
 plot.plot(buff2, 'g')
@@ -3,6 +3,8 @@ Provides SCPI access to Red Pitaya from host computer.
 """
 
 import socket
+import time
+import warnings
 from enum import Enum
 from typing import List, Optional, Union
 import numpy as np
@@ -134,9 +136,45 @@ class LCRExtShunt(Enum):
     S100K = "S100k"
     S1M = "S1M"
 
+def parse_ascii_data(raw: Union[bytes, str], dtype: type = np.float64) -> np.ndarray:
+    """
+    Converts an ASCII data reply (``{v1,v2,...,vn}``) to a numpy array.
+
+    The fields are parsed in C by ``np.fromstring``, without creating a Python object per sample.
+    The number of parsed values is checked against the number of fields in the reply.
+
+    Args:
+        raw (bytes or str): Reply as received from Red Pitaya, with or without the curly brackets.
+        dtype (type, optional): Data type of the returned array. Defaults to ``np.float64``.
+
+    Raises:
+        ValueError: If any field is not a number (an error reply, stray text or a truncated sample),
+            instead of returning a shortened array.
+    """
+    if isinstance(raw, str):
+        raw = raw.strip('{}\n\r ')
+        n_fields = raw.count(',') + 1
+    else:
+        raw = bytes(raw).strip(b'{}\n\r ')
+        n_fields = raw.count(b',') + 1
+    if not raw:
+        return np.empty(0, dtype=dtype)
+    try:
+        with warnings.catch_warnings():
+            # Older NumPy versions only warn (DeprecationWarning) when parsing stops at a bad field
+            warnings.simplefilter('error', DeprecationWarning)
+            data = np.fromstring(raw, dtype=dtype, sep=',')
+    except (ValueError, DeprecationWarning) as error:
+        raise ValueError(f"Malformed ASCII data reply: {error}") from None
+    if data.size != n_fields:
+        raise ValueError(f"Malformed ASCII data reply: parsed {data.size} of {n_fields} values")
+    return data
+
 class scpi (object):
     """SCPI class used to access Red Pitaya over an IP network."""
     delimiter = '\r\n'
+    sample_rate = 125e6         # ADC sample rate (S/s) before decimation
+    buffer_size = 16384         # Acquisition buffer length in samples
 
 
     ####################################################
@@ -1142,6 +1180,52 @@ class scpi (object):
         self.tx_txt("ACQ:STOP")
         self.check_error()
 
+    def wait_triggered(self, timeout: Optional[float] = 0.5, fill: bool = True) -> tuple:
+        """
+        Waits for the acquisition trigger and, optionally, for the buffer to fill.
+
+        ``ACQ:TRig:STAT?`` and ``ACQ:TRig:FILL?`` are polled with a growing interval instead
+        of back to back. The first interval is a fraction of the time needed to fill the
+        buffer at the current decimation; it doubles on every unsuccessful poll, up to the
+        full buffer time (at least 5 ms).
+
+        Parameters
+        ----------
+            timeout (float, optional):
+                Maximum time to wait in seconds. None waits forever.
+                Defaults to 0.5.
+            fill (bool, optional):
+                Also wait until the buffer is full after the trigger.
+                Defaults to True.
+
+        Returns
+        -------
+            (bool, float):
+                True if the trigger occurred (and the buffer filled, if `fill` is set)
+                before the timeout, and the time waited in seconds.
+        """
+        start = time.perf_counter()
+        deadline = None if timeout is None else start + timeout
+        buffer_time = self.buffer_size * int(self.txrx_txt("ACQ:DEC?")) / self.sample_rate
+        min_interval = max(buffer_time / 8, 1e-4)
+        max_interval = max(buffer_time, 5e-3)
+
+        def poll(query: str, expected: str) -> bool:
+            interval = min_interval
+            while self.txrx_txt(query) != expected:
+                now = time.perf_counter()
+                if deadline is not None and now >= deadline:
+                    return False
+                time.sleep(interval if deadline is None else min(interval, deadline - now))
+                interval = min(interval * 2, max_interval)
+            return True
+
+        done = poll("ACQ:TRig:STAT?", "TD")
+        if done and fill:
+            done = poll("ACQ:TRig:FILL?", "1")
+
+        return done, time.perf_counter() - start
+
     # Acq trigger
     def acq_trig_set(
         self,
@@ -1539,8 +1623,7 @@ class scpi (object):
                 buff = np.frombuffer(buff_byte, dtype='>i2')
                 #buff = [struct.unpack('!h',bytearray(buff_byte[i:i+2]))[0] for i in range(0, len(buff_byte), 2)]
         else:
-            buff_string = self.rx_txt().strip('{}\n\r').replace("  ", "").split(',')
-            buff = np.array(buff_string).astype(np.float64)
+            buff = parse_ascii_data(self.rx_txt())
         self.check_error()
 
         return buff
@@ -2017,9 +2100,7 @@ class scpi (object):
         
         #leitura dos canais um a um
         self.tx_txt(f'ACQ:SOUR{canal}:DATA?')
-        raw = self.rx_txt()
-        raw = raw.strip('{}\n\r').replace("  ", "").split(',')
-        return np.array(list(map(float, raw)))
+        return parse_ascii_data(self.rx_txt())
 
     def __configure__(self):
 
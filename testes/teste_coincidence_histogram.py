@@ -0,0 +1,120 @@
+"""
+Verificação (sem placa) do CoincidenceHistogram de teste_coincidências.py: contagens
+comparadas com np.histogram/np.histogram2d, estatísticas com as de todas as amostras
+juntas, e merge/snapshot/save/load.
+
+Rodar com:  python testes/teste_coincidence_histogram.py   (ou pytest testes/teste_coincidence_histogram.py)
+"""
+import importlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+tc = importlib.import_module("teste_coincidências")
+
+
+def aquisicoes(rng, n=20):
+    """Diferenças temporais e amplitudes de n aquisições, com valores fora das faixas."""
+    for _ in range(n):
+        k = rng.integers(0, 200)
+        yield (rng.uniform(-1e-9, 6e-9, k), rng.uniform(-0.1, 1.1, k), rng.uniform(-0.1, 1.1, k),
+               rng.uniform(0, 3))
+
+
+def acumular(hist, lotes):
+    for dt, a1, a2, acidentais in lotes:
+        hist.add(dt, a1, a2, acidentais)
+    return hist
+
+
+def test_igual_ao_numpy():
+    rng = np.random.default_rng(0)
+    lotes = list(aquisicoes(rng))
+    hist = acumular(tc.CoincidenceHistogram((0.0, 5e-9), 50, (0.0, 1.0), 16), lotes)
+    dt = np.concatenate([l[0] for l in lotes])
+    a1 = np.concatenate([l[1] for l in lotes])
+    a2 = np.concatenate([l[2] for l in lotes])
+
+    contagens, _ = np.histogram(dt, hist.dt_edges)
+    np.testing.assert_array_equal(hist.counts, contagens)
+    assert hist.underflow == np.count_nonzero(dt < 0) and hist.overflow == np.count_nonzero(dt > 5e-9)
+    amplitudes, _, _ = np.histogram2d(a1, a2, [hist.amp_edges, hist.amp_edges])
+    np.testing.assert_array_equal(hist.amplitudes, amplitudes)
+
+    estatisticas = hist.statistics()
+    assert estatisticas['total_coincidences'] == len(dt)
+    assert estatisticas['acquisitions'] == len(lotes)
+    np.testing.assert_allclose(
+        [estatisticas['mean_time_diff'], estatisticas['std_time_diff'],
+         estatisticas['min_time_diff'], estatisticas['max_time_diff'], estatisticas['accidental_coincidences']],
+        [dt.mean(), dt.std(), dt.min(), dt.max(), sum(l[3] for l in lotes)], rtol=1e-9)
+
+
+def test_borda_superior_no_ultimo_bin():
+    hist = tc.CoincidenceHistogram((0.0, 1.0), 4)
+    hist.add([0.0, 1.0, 0.25])
+    np.testing.assert_array_equal(hist.counts, [1, 1, 0, 1])
+    assert hist.underflow == hist.overflow == 0
+
+
+def test_merge_igual_a_acumular_junto():
+    rng = np.random.default_rng(1)
+    lotes = list(aquisicoes(rng))
+    unico = acumular(tc.CoincidenceHistogram(), lotes)
+    partes = [acumular(tc.CoincidenceHistogram(), lotes[k::3]) for k in range(3)]
+    combinado = partes[0]
+    combinado += partes[1]
+    combinado.merge(partes[2])
+    for nome in ('counts', 'amplitudes'):
+        np.testing.assert_array_equal(getattr(combinado, nome), getattr(unico, nome))
+    for nome in ('underflow', 'overflow', 'total', 'acquisitions', 'minimo', 'maximo'):
+        assert getattr(combinado, nome) == getattr(unico, nome), nome
+    np.testing.assert_allclose([combinado.soma, combinado.soma2, combinado.accidentals],
+                               [unico.soma, unico.soma2, unico.accidentals], rtol=1e-12)
+
+    try:
+        combinado.merge(tc.CoincidenceHistogram(n_bins=10))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("merge aceitou histogramas com bins diferentes")
+
+
+def test_snapshot_independente():
+    hist = tc.CoincidenceHistogram()
+    hist.add([1e-9], [0.5], [0.5])
+    copia = hist.snapshot()
+    hist.add([2e-9, 3e-9], [0.2, 0.3], [0.2, 0.3])
+    assert copia.total == 1 and copia.counts.sum() == 1 and copia.amplitudes.sum() == 1
+    assert hist.total == 3
+
+
+def test_save_load():
+    rng = np.random.default_rng(2)
+    hist = acumular(tc.CoincidenceHistogram((0.0, 5e-9), 50), aquisicoes(rng))
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'hist.npz')
+        hist.save(caminho)
+        hist.save(caminho)                  # substitui o arquivo anterior
+        assert os.listdir(pasta) == ['hist.npz']
+        lido = tc.CoincidenceHistogram.load(caminho)
+    np.testing.assert_array_equal(lido.counts, hist.counts)
+    np.testing.assert_array_equal(lido.amplitudes, hist.amplitudes)
+    np.testing.assert_array_equal(lido.dt_edges, hist.dt_edges)
+    assert lido.statistics() == hist.statistics()
+    # O histograma lido continua acumulando e combinando normalmente
+    lido.merge(hist)
+    lido.add([1e-9])
+    assert lido.total == 2 * hist.total + 1
+
+
+if __name__ == "__main__":
+    for nome, teste in list(globals().items()):
+        if nome.startswith("test_"):
+            teste()
+            print(f"{nome}: ok")
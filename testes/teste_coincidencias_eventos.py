@@ -0,0 +1,185 @@
+"""
+Verificação (sem placa) da detecção de picos, do CoincidenceEngine e do EventTagger de
+teste_coincidências.py: cada resultado vetorizado é comparado com um laço de força bruta
+equivalente à implementação antiga.
+
+Rodar com:  python testes/teste_coincidencias_eventos.py   (ou pytest testes/teste_coincidencias_eventos.py)
+"""
+import importlib
+import os
+import sys
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+tc = importlib.import_module("teste_coincidências")
+
+
+def analisador(time_window=5e-9):
+    """Analisador sem conexão (só os métodos de processamento são usados)."""
+    analyzer = tc.FrequencyCoincidenceAnalyzer.__new__(tc.FrequencyCoincidenceAnalyzer)
+    analyzer.time_window = time_window
+    analyzer.engine = tc.CoincidenceEngine(time_window)
+    return analyzer
+
+
+def sinal(rng, n=4000):
+    """Pulsos gaussianos em posições aleatórias mais ruído, com alguns platôs."""
+    x = rng.normal(0, 0.02, n)
+    t = np.arange(n)
+    for centro in rng.choice(n, 60, replace=False):
+        x += rng.uniform(0.1, 1.0) * np.exp(-0.5 * ((t - centro) / rng.uniform(1, 6)) ** 2)
+    x[100:105] = 0.5                        # platô: não é máximo estrito
+    return x
+
+
+# ---------------------------------------------------------------- find_peaks
+
+def picos_laco(data, threshold=0.05, min_distance=10):
+    """Implementação antiga de find_peaks."""
+    peaks = []
+    for i in range(1, len(data) - 1):
+        if (data[i] > data[i-1] and data[i] > data[i+1] and data[i] > threshold and
+                (len(peaks) == 0 or (i - peaks[-1]) >= min_distance)):
+            peaks.append(i)
+    return np.array(peaks, dtype=int)
+
+
+def test_find_peaks_igual_ao_laco():
+    rng = np.random.default_rng(1)
+    analyzer = analisador()
+    for min_distance in (1, 2, 10, 50):
+        for threshold in (-1.0, 0.05, 0.3):
+            x1, x2 = sinal(rng), sinal(rng)
+            np.testing.assert_array_equal(analyzer.find_peaks(x1, threshold, min_distance),
+                                          picos_laco(x1, threshold, min_distance))
+            bloco = analyzer.find_peaks(np.stack([x1, x2]), threshold, min_distance)
+            for x, picos in zip((x1, x2), bloco):
+                np.testing.assert_array_equal(picos, picos_laco(x, threshold, min_distance))
+
+
+def test_find_peaks_subamostra():
+    # Parábola amostrada: a interpolação parabólica recupera o vértice exato
+    vertice = 20.3
+    x = 1.0 - 0.01 * (np.arange(40) - vertice) ** 2
+    picos, posicoes = analisador().find_peaks(x, threshold=0.5, subsample='parabolic')
+    np.testing.assert_array_equal(picos, [20])
+    np.testing.assert_allclose(posicoes, [vertice])
+
+
+# ----------------------------------------------------------- CoincidenceEngine
+
+def pares_laco(t1, t2, janela):
+    """Todos os pares (i, j, t2 - t1) comparando todos contra todos."""
+    return sorted((i, j, b - a) for i, a in enumerate(t1) for j, b in enumerate(t2) if abs(b - a) <= janela)
+
+
+def tempos(rng, n, duracao=2e-6):
+    return rng.uniform(0, duracao, n)
+
+
+def test_pares_iguais_ao_laco():
+    rng = np.random.default_rng(2)
+    janela = 5e-9
+    engine = tc.CoincidenceEngine(janela)
+    for n1, n2 in ((0, 10), (10, 0), (50, 40), (300, 300)):
+        t1 = tempos(rng, n1)
+        # Metade do canal 2 correlacionada com o canal 1, fora de ordem
+        m = min(n1 // 2, n2)
+        t2 = np.concatenate([t1[:m] + rng.normal(0, 2e-9, m), tempos(rng, n2 - m)])
+        rng.shuffle(t2)
+        i, j, dt = engine.pairs(t1, t2)
+        assert np.all(np.diff(i) >= 0), "pares devem vir ordenados por i"
+        obtido = sorted(zip(i.tolist(), j.tolist(), dt.tolist()))
+        esperado = pares_laco(t1, t2, janela)
+        assert [p[:2] for p in obtido] == [p[:2] for p in esperado]
+        np.testing.assert_allclose([p[2] for p in obtido], [p[2] for p in esperado], rtol=0, atol=1e-18)
+
+
+def test_contagem_e_acidentais():
+    rng = np.random.default_rng(3)
+    janela = 5e-9
+    engine = tc.CoincidenceEngine(janela)
+    t1, t2 = tempos(rng, 400), tempos(rng, 400)
+    contagens = [len(pares_laco(t1, t2 + d, janela)) for d in engine.shifts]
+    np.testing.assert_array_equal(engine.count(t1, t2, engine.shifts), contagens)
+    assert engine.count(t1, t2) == len(pares_laco(t1, t2, janela))
+    media, desvio = engine.accidentals(t1, t2)
+    np.testing.assert_allclose([media, desvio], [np.mean(contagens), np.std(contagens)])
+
+
+# ----------------------------------------------------------------- EventTagger
+
+def eventos_laco(x, high, low, fs, t0=0.0, canal=1):
+    """Histerese amostra a amostra: sobe acima de high, desce abaixo de low."""
+    eventos = []
+    armado, subida = False, None
+    for k, v in enumerate(x):
+        if not armado and v > high:
+            armado, subida = True, k
+        elif armado and v < low:
+            armado = False
+            if subida > 0:          # Pulso já acima de high na primeira amostra: descartado
+                inicio = subida - 1 + (high - x[subida-1]) / (x[subida] - x[subida-1])
+                fim = k - 1 + (x[k-1] - low) / (x[k-1] - x[k])
+                eventos.append((canal, t0 + inicio / fs, x[subida:k].max(), (fim - inicio) / fs))
+    return eventos      # Pulso que não termina no bloco: descartado
+
+
+def test_event_tagger_igual_ao_laco():
+    rng = np.random.default_rng(4)
+    fs = 125e6
+    for high, low in ((0.3, 0.1), (0.3, 0.3), (0.5, None)):
+        tagger = tc.EventTagger(high, low, fs)
+        x = np.stack([sinal(rng), sinal(rng)])
+        x[0, 0] = 2.0                       # primeiro pulso já começa acima de high
+        x[1, -3:] = 2.0                     # último pulso não termina no bloco
+        eventos = tagger.tag(x, t0=1.5)
+        esperado = (eventos_laco(x[0], tagger.high, tagger.low, fs, 1.5, 1)
+                    + eventos_laco(x[1], tagger.high, tagger.low, fs, 1.5, 2))
+        assert len(eventos) == len(esperado)
+        np.testing.assert_array_equal(eventos['channel'], [e[0] for e in esperado])
+        np.testing.assert_allclose(eventos['timestamp'], [e[1] for e in esperado], rtol=0, atol=1e-15)
+        np.testing.assert_allclose(eventos['amplitude'], [e[2] for e in esperado], rtol=1e-6)
+        np.testing.assert_allclose(eventos['width'], [e[3] for e in esperado], rtol=1e-5)
+
+
+def test_event_tagger_histerese():
+    # Ruído em volta de high, sem cair abaixo de low: um único evento
+    x = np.array([0.0, 0.6, 0.45, 0.6, 0.45, 0.6, 0.0, 0.0])
+    eventos = tc.EventTagger(high=0.5, low=0.2, sample_rate=1.0).tag(x)
+    assert len(eventos) == 1
+    np.testing.assert_allclose(eventos['timestamp'], [0.5 / 0.6])
+    np.testing.assert_allclose(eventos['amplitude'], [0.6])
+
+
+def test_event_coincidences_indices_nos_eventos():
+    rng = np.random.default_rng(5)
+    analyzer = analisador()
+    tagger = tc.EventTagger(0.3, 0.1)
+    blocos = []
+    for k in range(3):
+        x = sinal(rng)
+        # Canal 2: o canal 1 atrasado de meia amostra (4 ns), dentro da janela de 5 ns
+        blocos.append(tagger.tag(np.stack([x, 0.5 * (x + np.roll(x, 1))]), t0=k * 1e-4))
+    eventos = np.concatenate(blocos)
+    rng.shuffle(eventos)                    # índices devem valer para a ordem de quem chama
+
+    i, j, dt, _ = analyzer.event_coincidences(eventos)
+    assert len(i) > 50
+    assert np.all(eventos['channel'][i] == 1) and np.all(eventos['channel'][j] == 2)
+    np.testing.assert_allclose(eventos['timestamp'][j] - eventos['timestamp'][i], dt, rtol=0, atol=1e-18)
+
+    idx1 = np.flatnonzero(eventos['channel'] == 1)
+    idx2 = np.flatnonzero(eventos['channel'] == 2)
+    esperado = pares_laco(eventos['timestamp'][idx1], eventos['timestamp'][idx2], analyzer.time_window)
+    assert sorted(zip(i.tolist(), j.tolist())) == sorted((int(idx1[a]), int(idx2[b])) for a, b, _ in esperado)
+
+
+if __name__ == "__main__":
+    for nome, teste in list(globals().items()):
+        if nome.startswith("test_"):
+            teste()
+            print(f"{nome}: ok")
@@ -0,0 +1,80 @@
+"""
+Verificação do parse_ascii_data (sem placa): compara com o laço antigo, que convertia
+campo a campo com float(), nas duas cópias da biblioteca.
+
+Rodar com:  python testes/teste_parse_ascii_data.py   (ou pytest testes/teste_parse_ascii_data.py)
+"""
+import importlib.util
+import os
+import sys
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import redpitaya_scpi
+
+# Cópia da biblioteca dentro de testes/ (carregada pelo caminho para não colidir com a da raiz)
+_spec = importlib.util.spec_from_file_location("redpitaya_scpi_testes", os.path.join(RAIZ, "testes", "redpitaya_scpi.py"))
+redpitaya_scpi_testes = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(redpitaya_scpi_testes)
+
+PARSERS = (redpitaya_scpi.parse_ascii_data, redpitaya_scpi_testes.parse_ascii_data)
+
+
+def parse_laco(raw):
+    """Implementação antiga: um float() por amostra."""
+    raw = raw.strip('{}\n\r').replace("  ", "").split(',')
+    return np.array(list(map(float, raw)))
+
+
+def resposta(valores):
+    """Resposta no formato do servidor SCPI."""
+    return "{" + ",".join(f"{v:.6f}" for v in valores) + "}\r\n"
+
+
+def test_igual_ao_laco():
+    rng = np.random.default_rng(0)
+    for n in (1, 2, 100, 16384):
+        texto = resposta(rng.uniform(-1, 1, n))
+        esperado = parse_laco(texto)
+        for parse in PARSERS:
+            np.testing.assert_array_equal(parse(texto), esperado)
+            np.testing.assert_array_equal(parse(texto.encode()), esperado)
+
+
+def test_formatos_aceitos():
+    for parse in PARSERS:
+        np.testing.assert_array_equal(parse("1.5, -2,3e-3"), [1.5, -2.0, 3e-3])
+        np.testing.assert_array_equal(parse(b"{1,2,3}"), [1.0, 2.0, 3.0])
+        assert parse("{}").size == 0
+        assert parse(b"").size == 0
+        inteiros = parse(b"{-8192,0,8191}", dtype=np.int16)
+        assert inteiros.dtype == np.int16
+        np.testing.assert_array_equal(inteiros, [-8192, 0, 8191])
+
+
+def test_resposta_malformada():
+    malformadas = (
+        "{1,2,x,4}",            # campo que não é número
+        "{1,2,3,}",             # amostra truncada no fim
+        "{1,,3}",               # campo vazio
+        "{1,2,3abc}",           # lixo colado no último número
+        "ERR!",                 # resposta de erro no lugar dos dados
+    )
+    for parse in PARSERS:
+        for texto in malformadas:
+            for raw in (texto, texto.encode()):
+                try:
+                    parse(raw)
+                except ValueError:
+                    continue
+                raise AssertionError(f"{parse.__module__}.parse_ascii_data aceitou {raw!r}")
+
+
+if __name__ == "__main__":
+    for nome, teste in list(globals().items()):
+        if nome.startswith("test_"):
+            teste()
+            print(f"{nome}: ok")
@@ -0,0 +1,105 @@
+"""
+Verificação (sem placa) do Waterfall de RedpitayaMath.py: o buffer circular é comparado
+com uma lista simples das últimas linhas (deque), e o histórico decimado com a média ou o
+máximo de cada grupo de linhas descartadas.
+
+Rodar com:  python testes/teste_waterfall.py   (ou pytest testes/teste_waterfall.py)
+"""
+import os
+import sys
+import tempfile
+from collections import deque
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import RedpitayaMath as rpmath
+
+
+def referencia(espectros, tempos, linhas, fator, reducao):
+    """Últimas linhas e histórico decimado calculados com deque e laço."""
+    ultimas = deque(maxlen=linhas)
+    descartadas = []
+    for espectro, tempo in zip(espectros, tempos):
+        if len(ultimas) == linhas:
+            descartadas.append(ultimas[0])
+        ultimas.append((espectro.astype(np.float32), tempo))
+
+    antigas = []
+    for k in range(0, len(descartadas) - fator + 1, fator):
+        grupo = descartadas[k:k + fator]
+        valores = np.array([g[0] for g in grupo], dtype=float)
+        linha = valores.mean(axis=0) if reducao == 'media' else valores.max(axis=0)
+        antigas.append((linha, np.mean([g[1] for g in grupo])))
+    return list(ultimas), antigas
+
+
+def test_buffer_circular():
+    rng = np.random.default_rng(0)
+    wf = rpmath.Waterfall(bins=32, linhas=10)
+    assert len(wf) == 0 and wf.ultimas().shape == (0, 32)
+    for n in range(1, 35):
+        espectro = rng.normal(size=32)
+        wf.adicionar(espectro, tempo=float(n))
+        assert len(wf) == min(n, 10)
+        np.testing.assert_array_equal(wf.tempos(), np.arange(max(1, n - 9), n + 1, dtype=float))
+        np.testing.assert_array_equal(wf.ultimas()[-1], espectro.astype(np.float32))
+
+    # ultimas() é uma visão contígua do buffer, sem cópia
+    vista = wf.ultimas(4)
+    assert vista.shape == (4, 32) and vista.flags['C_CONTIGUOUS']
+    assert np.shares_memory(vista, wf._dados)
+
+    try:
+        wf.adicionar(np.zeros(31))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("adicionar aceitou um espectro com o número errado de bins")
+
+
+def test_igual_a_referencia_com_decimacao():
+    rng = np.random.default_rng(1)
+    for reducao in ('media', 'max'):
+        for n in (5, 12, 47, 200):
+            wf = rpmath.Waterfall(bins=16, linhas=12, fator=3, linhas_antigas=20, reducao=reducao)
+            espectros = rng.normal(size=(n, 16))
+            tempos = np.cumsum(rng.uniform(0.1, 1.0, n))
+            for espectro, tempo in zip(espectros, tempos):
+                wf.adicionar(espectro, tempo)
+
+            ultimas, antigas = referencia(espectros, tempos, 12, 3, reducao)
+            np.testing.assert_array_equal(wf.ultimas(), np.array([u[0] for u in ultimas]).reshape(-1, 16))
+            np.testing.assert_array_equal(wf.tempos(), [u[1] for u in ultimas])
+
+            antigas = antigas[-20:]
+            assert len(wf.antigo) == len(antigas)
+            if antigas:
+                np.testing.assert_allclose(wf.antigo.ultimas(), np.array([a[0] for a in antigas]), rtol=1e-6, atol=1e-6)
+                np.testing.assert_allclose(wf.antigo.tempos(), [a[1] for a in antigas])
+
+
+def test_salvar():
+    rng = np.random.default_rng(2)
+    wf = rpmath.Waterfall(bins=8, linhas=5, fator=2)
+    for n in range(13):
+        wf.adicionar(rng.normal(size=8), tempo=float(n))
+    freq = np.linspace(0, 1e6, 8)
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'waterfall.npz')
+        wf.salvar(caminho, freq)
+        with np.load(caminho) as arquivo:
+            np.testing.assert_array_equal(arquivo['espectros'], wf.ultimas())
+            np.testing.assert_array_equal(arquivo['tempos'], wf.tempos())
+            np.testing.assert_array_equal(arquivo['freq'], freq)
+            np.testing.assert_array_equal(arquivo['espectros_antigos'], wf.antigo.ultimas())
+            np.testing.assert_array_equal(arquivo['tempos_antigos'], wf.antigo.tempos())
+
+
+if __name__ == "__main__":
+    for nome, teste in list(globals().items()):
+        if nome.startswith("test_"):
+            teste()
+            print(f"{nome}: ok")